@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 
-from flask import Flask, render_template, request, jsonify
-import json
+from flask import Flask, render_template, request
+from flask.json.provider import DefaultJSONProvider, JSONProvider
 import os
 import datetime
 import requests
 import logging
-from typing import Dict, List, Any, Optional
-import uuid
-import copy
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Any, Optional, Tuple, FrozenSet
+import threading
+import time
+import queue
+from collections import OrderedDict
+import atexit
+import signal
+import sys
+import hashlib
+import heapq
+import functools
+import orjson
 
 # Import our existing ALM functionality
 from main import (
@@ -20,361 +30,733 @@ from main import (
     OLLAMA_MODEL,
     OLLAMA_URL,
     REQUEST_TIMEOUT,
+    get_ollama_session,
 )
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson.
+    
+    Makes jsonify() and request.get_json() encode and decode in native code.
+    Output is compact and keys keep their insertion order.
+    """
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default).decode('utf-8')
+    
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+    
+    def response(self, *args: Any, **kwargs: Any):
+        # Hand orjson's bytes straight to the response instead of via str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=DefaultJSONProvider.default),
+            mimetype='application/json'
+        )
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
-# Configure logging for the web app
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('alm_web.log'),
-        logging.StreamHandler()
-    ]
-)
+def _json_response(obj: Any, status: int = 200):
+    """Build a JSON response with orjson instead of going through jsonify"""
+    return app.response_class(orjson.dumps(obj), status=status, mimetype='application/json')
+
+@functools.lru_cache(maxsize=64)
+def _error_payload(message: str) -> bytes:
+    """JSON body for an error message, encoded once per distinct message"""
+    return orjson.dumps({"error": message})
+
+def _error_response(message: str, status: int):
+    """Build a JSON error response from the cached body for message"""
+    return app.response_class(_error_payload(message), status=status, mimetype='application/json')
+
+def _new_id(nbytes: int = 16) -> str:
+    """Random hex id, 32 characters by default like uuid4().hex"""
+    return os.urandom(nbytes).hex()
+
+def _utc_timestamp() -> str:
+    """Current UTC time as an ISO 8601 string"""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+# Configure logging for the web app. Request threads only put records on a
+# queue; a listener thread formats them and does the file and console I/O.
+# force=True replaces the handlers main.py installed on import.
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    RotatingFileHandler('alm_web.log', maxBytes=10 * 1024 * 1024, backupCount=3, delay=True),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)], force=True)
 logger = logging.getLogger(__name__)
 
 # Enhanced memory structure for conversation trees
 TREE_MEMORY_FILE = "alm_tree_memory.json"
-GHOST_BRANCH_FILE = "alm_ghost_branches.json"
+CONTEXT_MAX_LINES = 10  # Number of "Human:"/"Assistant:" lines sent as context
+CONTEXT_CACHE_SIZE = 1024  # nodes whose context is kept, least recently used dropped first
+OLLAMA_TAGS_URL = f"{OLLAMA_URL.rsplit('/', 1)[0]}/tags"
+OLLAMA_STATUS_TTL = 1.0  # seconds a connection check result is reused
+OLLAMA_MODELS_TTL = 30.0  # seconds a fetched model list is reused
+TREE_SAVE_DELAY = 0.05  # seconds to wait so bursts of saves become one write
+TREE_SAVE_MAX_DELAY = 0.5  # longest a save waits for a burst of saves to settle
+TREE_JOURNAL_MAX_RECORDS = 1000  # journal records kept before folding them into the tree file
+TREE_MAX_NODES = int(os.getenv('ALM_MAX_NODES', '10000'))  # oldest leaves are evicted past this
+TREE_EVICT_SLACK = int(os.getenv('ALM_EVICT_SLACK', '0'))  # extra nodes evicted below the cap, to batch evictions
+EDIT_HISTORY_MAX = 20  # edit history entries kept on a node; older ones go to the edits log
+
+# Fixed parts of the chat prompt; only the context and question vary per turn
+PROMPT_CONTEXT_HEADER = "You are an autonomous language model. Here's our conversation so far:\n\n"
+PROMPT_CONTEXT_QUESTION = "\n\nNow respond to: "
+PROMPT_NO_CONTEXT = "You are an autonomous language model. Respond to: "
 
 class TreeMemoryManager:
-    def __init__(self):
-        self.tree = self.load_tree()
-        self.ghost_branches = self.load_ghost_branches()
+    """Object interface to the conversation tree.
     
-    def load_tree(self) -> Dict[str, Any]:
-        """Load conversation tree from file"""
-        if os.path.exists(TREE_MEMORY_FILE):
-            try:
-                with open(TREE_MEMORY_FILE, 'r', encoding='utf-8') as f:
-                    tree_data = json.load(f)
-                    # Ensure required structure
-                    if 'nodes' not in tree_data:
-                        tree_data['nodes'] = {}
-                    if 'root_id' not in tree_data:
-                        tree_data['root_id'] = None
-                    return tree_data
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"Error loading tree memory: {e}")
-        
-        # Return empty tree structure
-        return {
-            'nodes': {},
-            'root_id': None
-        }
+    The tree itself is the process-wide cached copy behind load_tree_memory()
+    and save_tree_memory(), so the manager and the request handlers always
+    see the same nodes and nothing is parsed from disk more than once.
+    """
     
-    def load_ghost_branches(self) -> Dict[str, Any]:
-        """Load ghost branches from file"""
-        if os.path.exists(GHOST_BRANCH_FILE):
-            try:
-                with open(GHOST_BRANCH_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"Error loading ghost branches: {e}")
-        return {}
+    @property
+    def tree(self) -> Dict[str, Any]:
+        return load_tree_memory()
+    
+    @tree.setter
+    def tree(self, tree_data: Dict[str, Any]) -> None:
+        save_tree_memory(tree_data)
+    
+    @property
+    def ghost_branches(self) -> Dict[str, Any]:
+        """Ghost branches, stored in the tree next to its nodes"""
+        with _TREE_LOCK:
+            return self.tree.setdefault('ghost_branches', {})
+    
+    def load_tree(self) -> Dict[str, Any]:
+        """Load conversation tree, from disk only on first use"""
+        return load_tree_memory()
     
     def save_tree(self):
-        """Save conversation tree to file"""
-        try:
-            with open(TREE_MEMORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.tree, f, indent=2, ensure_ascii=False)
-            logger.info("Tree memory saved successfully")
-        except IOError as e:
-            logger.error(f"Error saving tree memory: {e}")
-    
-    def save_ghost_branches(self):
-        """Save ghost branches to file"""
-        try:
-            with open(GHOST_BRANCH_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.ghost_branches, f, indent=2, ensure_ascii=False)
-            logger.info("Ghost branches saved successfully")
-        except IOError as e:
-            logger.error(f"Error saving ghost branches: {e}")
+        """Schedule the conversation tree to be written to file"""
+        save_tree_memory(self.tree)
     
     def create_ghost_branch(self, node_id: str, reason: str = "Node edited") -> str:
         """Create a ghost branch from a node and its descendants"""
-        if node_id not in self.tree['nodes']:
-            raise ValueError(f"Node {node_id} not found")
-        
-        # Generate unique ghost ID
-        ghost_id = f"ghost_{uuid.uuid4().hex[:8]}"
-        
-        # Deep copy the subtree starting from this node
-        ghost_nodes = self._copy_subtree(node_id)
-        
-        # Count nodes and get root content for display
-        node_count = len(ghost_nodes)
-        root_node = self.tree['nodes'][node_id]
-        root_content = (root_node.get('user_input', '') or root_node.get('ai_response', ''))[:50]
-        if len(root_content) > 50:
-            root_content += "..."
-        
-        # Create ghost branch metadata
-        ghost_branch = {
-            'id': ghost_id,
-            'original_node_id': node_id,
-            'created_at': datetime.datetime.now().isoformat(),
-            'reason': reason,
-            'nodes': ghost_nodes,
-            'node_count': node_count,
-            'root_content': root_content
-        }
-        
-        # Save ghost branch
-        self.ghost_branches[ghost_id] = ghost_branch
-        self.save_ghost_branches()
-        
-        logger.info(f"Created ghost branch {ghost_id} from node {node_id} with {node_count} nodes")
-        return ghost_id
-    
-    def _copy_subtree(self, node_id: str) -> Dict[str, Any]:
-        """Recursively copy a subtree starting from node_id"""
-        subtree = {}
-        
-        def copy_node_recursive(current_id: str):
-            if current_id not in self.tree['nodes']:
-                return
-            
-            # Deep copy the node
-            node = copy.deepcopy(self.tree['nodes'][current_id])
-            subtree[current_id] = node
-            
-            # Recursively copy children
-            if 'children' in node and node['children']:
-                for child_id in node['children']:
-                    copy_node_recursive(child_id)
-        
-        copy_node_recursive(node_id)
-        return subtree
+        with _TREE_LOCK:
+            if node_id not in self.tree['nodes']:
+                raise ValueError(f"Node {node_id} not found")
+            ghost_id = create_ghost_branch(self.tree, node_id, reason)
+            self.save_tree()
+            return ghost_id
     
     def remove_subtree(self, node_id: str):
         """Remove a subtree starting from node_id"""
-        def remove_recursive(current_id: str):
-            if current_id not in self.tree['nodes']:
-                return
-            
-            node = self.tree['nodes'][current_id]
-            
-            # Recursively remove children first
-            if 'children' in node and node['children']:
-                for child_id in list(node['children']):  # Use list() to avoid iteration issues
-                    remove_recursive(child_id)
-            
-            # Remove this node
-            del self.tree['nodes'][current_id]
-        
-        # Remove all children but keep the node itself
-        node = self.tree['nodes'].get(node_id)
-        if node and 'children' in node and node['children']:
-            for child_id in list(node['children']):
-                remove_recursive(child_id)
-            node['children'] = []
+        with _TREE_LOCK:
+            # Remove all children but keep the node itself
+            remove_subtree(self.tree, node_id, preserve_root=True)
+            self.save_tree()
     
     def edit_node(self, node_id: str, user_input: str = None, ai_response: str = None, 
                   create_ghost: bool = False) -> Dict[str, Any]:
         """Edit a node's content and optionally create ghost branches"""
-        if node_id not in self.tree['nodes']:
-            raise ValueError(f"Node {node_id} not found")
-        
-        node = self.tree['nodes'][node_id]
-        result = {}
-        
-        # Check if node has children
-        has_children = 'children' in node and node['children']
-        
-        # Create ghost branch if requested and node has children
-        ghost_branch_id = None
-        if create_ghost and has_children:
-            ghost_branch_id = self.create_ghost_branch(node_id, "Node edited - preserving children")
-            result['ghost_branch_id'] = ghost_branch_id
-        
-        # Remove children if not creating ghost branch
-        children_removed = False
-        if has_children and not create_ghost:
-            self.remove_subtree(node_id)
-            children_removed = True
-            result['children_removed'] = True
-        elif has_children and create_ghost:
-            # Still remove children from main tree after creating ghost
-            self.remove_subtree(node_id)
-        
-        # Update node content
-        if user_input is not None:
-            node['user_input'] = user_input
-        
-        if ai_response is not None:
-            node['ai_response'] = ai_response
-        
-        # Add edit history
-        if 'edit_history' not in node:
-            node['edit_history'] = []
-        
-        edit_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'ghost_created': ghost_branch_id if ghost_branch_id else None
-        }
-        node['edit_history'].append(edit_entry)
-        
-        # Update timestamp
-        node['timestamp'] = datetime.datetime.now().isoformat()
-        
-        # Save changes
-        self.save_tree()
-        
-        logger.info(f"Edited node {node_id}, ghost: {ghost_branch_id}, children removed: {children_removed}")
-        return result
+        with _TREE_LOCK:
+            if node_id not in self.tree['nodes']:
+                raise ValueError(f"Node {node_id} not found")
+            return _edit_node(self.tree, node_id, user_input, ai_response, create_ghost)
     
     def restore_ghost_branch(self, ghost_id: str) -> bool:
         """Restore a ghost branch back to the main tree"""
-        if ghost_id not in self.ghost_branches:
-            raise ValueError(f"Ghost branch {ghost_id} not found")
-        
-        ghost_branch = self.ghost_branches[ghost_id]
-        original_node_id = ghost_branch['original_node_id']
-        
-        # Check if original node still exists
-        if original_node_id not in self.tree['nodes']:
-            raise ValueError(f"Original node {original_node_id} no longer exists")
-        
-        # Add ghost nodes back to main tree
-        ghost_nodes = ghost_branch['nodes']
-        
-        # First, add all nodes
-        for ghost_node_id, ghost_node in ghost_nodes.items():
-            if ghost_node_id not in self.tree['nodes']:
-                self.tree['nodes'][ghost_node_id] = ghost_node
-        
-        # Then, restore the parent-child relationship for the root node
-        original_node = self.tree['nodes'][original_node_id]
-        if 'children' not in original_node:
-            original_node['children'] = []
-        
-        # Find the children that should be restored to the original node
-        for ghost_node_id, ghost_node in ghost_nodes.items():
-            # If this ghost node was a direct child of the original node
-            if ghost_node_id in ghost_nodes and ghost_node_id != original_node_id:
-                # Check if it should be a direct child by seeing if it was in original children
-                if ghost_node_id not in original_node['children']:
-                    original_node['children'].append(ghost_node_id)
-        
-        # Save changes
-        self.save_tree()
-        
-        logger.info(f"Restored ghost branch {ghost_id} to main tree")
-        return True
+        with _TREE_LOCK:
+            if ghost_id not in self.ghost_branches:
+                raise ValueError(f"Ghost branch {ghost_id} not found")
+            original_node_id = self.ghost_branches[ghost_id]['original_node_id']
+            if original_node_id not in self.tree['nodes']:
+                raise ValueError(f"Original node {original_node_id} no longer exists")
+            _restore_ghost(self.tree, ghost_id)
+            return True
     
     def delete_ghost_branch(self, ghost_id: str) -> bool:
         """Permanently delete a ghost branch"""
-        if ghost_id not in self.ghost_branches:
-            raise ValueError(f"Ghost branch {ghost_id} not found")
-        
-        del self.ghost_branches[ghost_id]
-        self.save_ghost_branches()
-        
-        logger.info(f"Deleted ghost branch {ghost_id}")
-        return True
+        with _TREE_LOCK:
+            if ghost_id not in self.ghost_branches:
+                raise ValueError(f"Ghost branch {ghost_id} not found")
+            _delete_ghost(self.tree, ghost_id)
+            return True
     
     def add_conversation(self, parent_id: Optional[str], user_input: str, 
                         ai_response: str, model_used: str) -> str:
         """Add a new conversation to the tree"""
-        node_id = str(uuid.uuid4())
-        timestamp = datetime.datetime.now().isoformat()
+        node_id = _new_id()
+        timestamp = _utc_timestamp()
         
         node = {
             'id': node_id,
             'user_input': user_input,
             'ai_response': ai_response,
+            'parent_id': parent_id,
             'model_used': model_used,
             'timestamp': timestamp,
             'children': []
         }
         
-        # Add to tree
-        self.tree['nodes'][node_id] = node
-        
-        if parent_id:
-            # Add as child to parent
-            if parent_id in self.tree['nodes']:
-                if 'children' not in self.tree['nodes'][parent_id]:
-                    self.tree['nodes'][parent_id]['children'] = []
-                self.tree['nodes'][parent_id]['children'].append(node_id)
-        else:
-            # This is the root node
-            self.tree['root_id'] = node_id
-        
-        self.save_tree()
+        with _TREE_LOCK:
+            tree_data = self.tree
+            
+            # Add to tree
+            tree_data['nodes'][node_id] = node
+            
+            if parent_id:
+                # Add as child to parent
+                parent = tree_data['nodes'].get(parent_id)
+                if parent is not None:
+                    parent.setdefault('children', []).append(node_id)
+            else:
+                # This is the root node
+                tree_data['root_id'] = node_id
+            
+            save_tree_node(tree_data, node)
         return node_id
     
     def reset_tree(self):
         """Reset the entire conversation tree"""
+        # Ghost branches live in the tree, so they are cleared with it
         self.tree = {
             'nodes': {},
             'root_id': None
         }
-        self.save_tree()
-        
-        # Also clear ghost branches
-        self.ghost_branches = {}
-        self.save_ghost_branches()
         
         logger.info("Tree and ghost branches reset")
 
 # Global memory manager instance
 memory_manager = TreeMemoryManager()
 
-def load_tree_memory() -> Dict[str, Any]:
-    """Load conversation tree from disk"""
+# In-memory copy of the conversation tree shared by all requests. Reads are
+# served from here and the file is only touched on first use and on mutation.
+# The cache remembers which file it was loaded from so that pointing
+# TREE_MEMORY_FILE somewhere else (e.g. in tests) transparently reloads it.
+_TREE_CACHE: Optional[Dict[str, Any]] = None
+_TREE_CACHE_FILE: Optional[str] = None
+_TREE_LOCK = threading.RLock()
+
+# Ids of the last CONTEXT_MAX_LINES nodes on the root-to-node path, per node
+# of the cached tree. A new node's path is its parent's path plus itself, so
+# building context never has to walk the parent links of a deep tree.
+_PATH_CACHE: "OrderedDict[str, List[str]]" = OrderedDict()
+
+# Rendered context (lines and joined text) per node of the cached tree. A
+# node's context only changes when the node itself is edited, and editing
+# removes or ghosts its descendants, so dropping that one entry is enough.
+# Both caches hold the CONTEXT_CACHE_SIZE most recently used nodes, which
+# covers the branches being chatted on without keeping text for every node.
+_CONTEXT_CACHE: "OrderedDict[str, Tuple[List[str], str]]" = OrderedDict()
+
+def _cache_get(cache: "OrderedDict[str, Any]", key: Optional[str]) -> Any:
+    """Look up key in an LRU cache, marking it as recently used"""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+def _cache_put(cache: "OrderedDict[str, Any]", key: str, value: Any) -> None:
+    """Store key in an LRU cache, dropping the least recently used entry"""
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > CONTEXT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+# Serialized cached tree and its ETag, shared by GET /api/tree and the
+# background writer. Dropped whenever the tree is saved, i.e. has changed.
+_TREE_SERIALIZED: Optional[Tuple[bytes, str]] = None
+
+def _read_tree_file() -> Dict[str, Any]:
+    """Read the conversation tree from disk"""
     try:
         if os.path.exists(TREE_MEMORY_FILE):
-            with open(TREE_MEMORY_FILE, "r", encoding='utf-8') as f:
-                return json.load(f)
+            # Unbuffered: FileIO.read() sizes one read() from fstat, so the
+            # whole file lands in a single bytes object for orjson
+            with open(TREE_MEMORY_FILE, "rb", buffering=0) as f:
+                return orjson.loads(f.read())
         return {"nodes": {}, "root_id": None}
     except Exception as e:
-        logger.error(f"Failed to load tree memory: {e}")
+        logger.error("Failed to load tree memory: %s", e)
         return {"nodes": {}, "root_id": None}
 
-def save_tree_memory(tree_data: Dict[str, Any]) -> None:
-    """Save conversation tree to disk"""
+def _journal_path(path: str) -> str:
+    """Path of the append-only journal that accompanies a tree file"""
+    return os.path.splitext(path)[0] + ".jsonl"
+
+def _edits_path(path: str) -> str:
+    """Path of the append-only log of edit history trimmed from a tree's nodes"""
+    return os.path.splitext(path)[0] + ".edits.jsonl"
+
+def _replay_journal(tree_data: Dict[str, Any], path: str) -> int:
+    """Apply the records journaled since the tree file was last written.
+    
+    A plain node record adds a new node; an {"op": "edit"} record replaces a
+    node with its edited state and drops its descendants, storing the ghost
+    branch they were moved to if it has one. {"op": "restore_ghost"} and
+    {"op": "delete_ghost"} records restore or drop a ghost branch. Records
+    are idempotent (known nodes are not re-added, edits of nodes and ghosts
+    that are gone are skipped), so replaying a journal that overlaps the
+    tree file is harmless. Returns the number of records applied.
+    """
     try:
-        with open(TREE_MEMORY_FILE, "w", encoding='utf-8') as f:
-            json.dump(tree_data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Failed to save tree memory: {e}")
-        raise MemoryError(f"Could not save tree memory: {e}")
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return 0
+    
+    nodes = tree_data["nodes"]
+    replayed = 0
+    with f:
+        for line in f:
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # Only the last record can be torn, by a crash mid-append
+                logger.warning("Ignoring incomplete record at the end of %s", path)
+                break
+            op = record.get("op")
+            if op == "edit":
+                node = record["node"]
+                node_id = node["id"]
+                if node_id not in nodes:
+                    continue
+                remove_subtree(tree_data, node_id, preserve_root=True)
+                nodes[node_id] = node
+                ghost = record.get("ghost")
+                if ghost is not None:
+                    tree_data.setdefault("ghost_branches", {})[ghost["id"]] = ghost
+                replayed += 1
+                continue
+            if op == "restore_ghost":
+                ghost = tree_data.get("ghost_branches", {}).get(record["ghost_id"])
+                if ghost is None or ghost["original_node_id"] not in nodes:
+                    continue
+                _restore_ghost_nodes(tree_data, record["ghost_id"])
+                replayed += 1
+                continue
+            if op == "delete_ghost":
+                if tree_data.get("ghost_branches", {}).pop(record["ghost_id"], None) is not None:
+                    replayed += 1
+                continue
+            
+            node_id = record["id"]
+            if node_id in nodes:
+                continue
+            nodes[node_id] = record
+            parent_id = record.get("parent_id")
+            parent = nodes.get(parent_id) if parent_id else None
+            if parent is not None:
+                parent.setdefault("children", []).append(node_id)
+            else:
+                tree_data["root_id"] = node_id
+            replayed += 1
+    return replayed
 
-def build_conversation_context(tree_data: Dict[str, Any], node_id: str) -> str:
-    """Build conversation context from root to specified node"""
-    if not node_id or node_id not in tree_data["nodes"]:
-        return ""
+def _share_node_strings(tree_data: Dict[str, Any]) -> None:
+    """Point every reference to a node id at the one string used as its key.
+    
+    Parsing gives each node's id, parent_id and its entry in the parent's
+    children separate copies of the same id; sharing one object saves about
+    240 bytes per node. Ghost branches, whose nodes repeat ids of the tree,
+    share the same strings, and model names are shared the same way.
+    """
+    nodes = tree_data["nodes"]
+    ids = {node_id: node_id for node_id in nodes}
+    models: Dict[str, str] = {}
+    _share_ids(nodes, ids, models)
+    for ghost in tree_data.get("ghost_branches", {}).values():
+        ghost["nodes"] = {ids.setdefault(node_id, node_id): node
+                          for node_id, node in ghost.get("nodes", {}).items()}
+        _share_ids(ghost["nodes"], ids, models)
+        for key in ("original_node_id", "root_id"):
+            if key in ghost:
+                ghost[key] = ids.get(ghost[key], ghost[key])
+
+def _share_ids(nodes: Dict[str, Any], ids: Dict[str, str], models: Dict[str, str]) -> None:
+    """Replace the ids and model names in nodes with the shared strings"""
+    for node_id, node in nodes.items():
+        if node.get("id") == node_id:
+            node["id"] = node_id
+        parent_id = node.get("parent_id")
+        if parent_id:
+            node["parent_id"] = ids.get(parent_id, parent_id)
+        children = node.get("children")
+        if children:
+            node["children"] = [ids.get(child_id, child_id) for child_id in children]
+        model = node.get("model_used")
+        if model:
+            node["model_used"] = models.setdefault(model, model)
+
+def load_tree_memory() -> Dict[str, Any]:
+    """Return the cached conversation tree, loading it from disk on first use"""
+    global _TREE_CACHE, _TREE_CACHE_FILE, _TREE_SERIALIZED
+    with _TREE_LOCK:
+        if _TREE_CACHE is None or _TREE_CACHE_FILE != TREE_MEMORY_FILE:
+            _TREE_CACHE = _read_tree_file()
+            _TREE_CACHE_FILE = TREE_MEMORY_FILE
+            _TREE_SERIALIZED = None
+            _PATH_CACHE.clear()
+            _CONTEXT_CACHE.clear()
+            replayed = _replay_journal(_TREE_CACHE, _journal_path(TREE_MEMORY_FILE))
+            _share_node_strings(_TREE_CACHE)
+            if replayed:
+                # Fold the replayed records into the tree file
+                tree_writer.schedule(TREE_MEMORY_FILE, _TREE_CACHE)
+        return _TREE_CACHE
+
+def _write_all(fd: int, payload: bytes) -> None:
+    """Write all of payload to fd and flush it to disk"""
+    view = memoryview(payload)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+    os.fsync(fd)
+
+def _write_file_atomic(path: str, payload: bytes) -> None:
+    """Write payload to path in one go, replacing the old file atomically"""
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        _write_all(fd, payload)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+def _append_file(path: str, payload: bytes) -> None:
+    """Append payload to path, creating the file if needed"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        _write_all(fd, payload)
+    finally:
+        os.close(fd)
+
+class TreeWriter:
+    """Write-behind persistence for the conversation tree.
     
-    # Build path from root to current node
+    Saves are queued and written by a background thread, so requests never
+    wait on the disk. The writer pauses briefly before each write, and keeps
+    pausing while more saves arrive (up to max_delay), so that a burst of
+    saves collapses into a single write of the latest tree.
+    
+    A save either rewrites the whole tree file or, when it carries a journal
+    record, appends that record to the tree's journal. Once the journal holds
+    TREE_JOURNAL_MAX_RECORDS records it is folded back into the tree file.
+    """
+    
+    def __init__(self, delay: float = TREE_SAVE_DELAY, max_records: int = TREE_JOURNAL_MAX_RECORDS,
+                 max_delay: float = TREE_SAVE_MAX_DELAY):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.max_records = max_records
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any], Optional[bytes]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._journal_records: Dict[str, int] = {}
+    
+    def schedule(self, path: str, tree_data: Dict[str, Any], record: Optional[bytes] = None) -> None:
+        """Queue tree_data to be written to path, or just record to its journal"""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="tree-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put((path, tree_data, record))
+    
+    def flush(self) -> None:
+        """Block until every queued save has been written"""
+        self._queue.join()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            waited = 0.0
+            while True:
+                time.sleep(self.delay)
+                waited += self.delay
+                settled = True
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                    settled = False
+                if settled or waited >= self.max_delay:
+                    break
+            
+            # Whatever goes wrong, the thread keeps running and every queued
+            # save is marked done, so flush() (and the atexit hook) can't hang
+            try:
+                self._write_batch(batch)
+            except Exception:
+                logger.exception("Tree writer failed on a batch of %d saves", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, Any], Optional[bytes]]]) -> None:
+        # Only the latest full write for each file is needed, and it
+        # already contains every record queued ahead of it
+        last_write = {path: i for i, (path, _, record) in enumerate(batch) if record is None}
+        records: Dict[str, List[bytes]] = {}
+        trees: Dict[str, Dict[str, Any]] = {}
+        for i, (path, tree_data, record) in enumerate(batch):
+            if record is None:
+                if last_write[path] == i:
+                    self._write(path, tree_data)
+            elif i > last_write.get(path, -1):
+                records.setdefault(path, []).append(record)
+                trees[path] = tree_data
+        for path, path_records in records.items():
+            self._append(path, trees[path], path_records)
+    
+    def _write(self, path: str, tree_data: Dict[str, Any]) -> None:
+        try:
+            _write_file_atomic(path, _serialize_tree(tree_data)[0])
+            # The tree file now holds everything the journal did
+            try:
+                os.remove(_journal_path(path))
+            except FileNotFoundError:
+                pass
+            self._journal_records[path] = 0
+        except Exception as e:
+            logger.error("Failed to save tree memory: %s", e)
+    
+    def _append(self, path: str, tree_data: Dict[str, Any], records: List[bytes]) -> None:
+        try:
+            _append_file(_journal_path(path), b"\n".join(records) + b"\n")
+        except Exception as e:
+            logger.error("Failed to append to tree journal: %s", e)
+            # Fall back to writing the whole tree
+            self._write(path, tree_data)
+            return
+        count = self._journal_records.get(path, 0) + len(records)
+        self._journal_records[path] = count
+        if count >= self.max_records:
+            self._write(path, tree_data)
+
+tree_writer = TreeWriter()
+atexit.register(tree_writer.flush)
+
+def _serialize_tree(tree_data: Dict[str, Any]) -> Tuple[bytes, str]:
+    """Return tree_data as JSON bytes plus an ETag for them.
+    
+    The result for the cached tree is kept until the next save, so repeated
+    GETs and the disk write share a single serialization.
+    """
+    global _TREE_SERIALIZED
+    # Serialize under the tree lock so handlers cannot mutate mid-dump
+    with _TREE_LOCK:
+        if tree_data is _TREE_CACHE and _TREE_SERIALIZED is not None:
+            return _TREE_SERIALIZED
+        payload = orjson.dumps(tree_data)
+        serialized = (payload, hashlib.blake2b(payload, digest_size=8).hexdigest())
+        if tree_data is _TREE_CACHE:
+            _TREE_SERIALIZED = serialized
+        return serialized
+
+def save_tree_memory(tree_data: Dict[str, Any]) -> None:
+    """Make tree_data the cached tree and schedule it to be written to disk"""
+    global _TREE_CACHE, _TREE_CACHE_FILE, _TREE_SERIALIZED
+    with _TREE_LOCK:
+        _TREE_SERIALIZED = None
+        if tree_data is not _TREE_CACHE:
+            _PATH_CACHE.clear()
+            _CONTEXT_CACHE.clear()
+        _TREE_CACHE = tree_data
+        _TREE_CACHE_FILE = TREE_MEMORY_FILE
+    tree_writer.schedule(TREE_MEMORY_FILE, tree_data)
+
+def _save_tree_record(tree_data: Dict[str, Any], record: Any) -> None:
+    """Make tree_data the cached tree and journal a record of its last change"""
+    global _TREE_CACHE, _TREE_CACHE_FILE, _TREE_SERIALIZED
+    with _TREE_LOCK:
+        _TREE_SERIALIZED = None
+        if tree_data is not _TREE_CACHE:
+            _PATH_CACHE.clear()
+            _CONTEXT_CACHE.clear()
+        _TREE_CACHE = tree_data
+        _TREE_CACHE_FILE = TREE_MEMORY_FILE
+        # Serialized now, since the node keeps changing after this returns
+        payload = orjson.dumps(record)
+    tree_writer.schedule(TREE_MEMORY_FILE, tree_data, payload)
+
+def save_tree_node(tree_data: Dict[str, Any], node: Dict[str, Any]) -> None:
+    """Persist a node just added to tree_data by appending it to the journal.
+    
+    Cheaper than save_tree_memory for chat turns, which only ever add a leaf:
+    the node is written on its own instead of the whole tree.
+    """
+    _save_tree_record(tree_data, node)
+
+def save_node_edit(tree_data: Dict[str, Any], node: Dict[str, Any],
+                   ghost: Optional[Dict[str, Any]] = None) -> None:
+    """Persist an edited node, whose descendants were removed, to the journal.
+    
+    ghost is the ghost branch the descendants were moved to, if any; it is
+    journaled with the edit, so the rest of the tree is not rewritten.
+    """
+    record = {"op": "edit", "node": node}
+    if ghost is not None:
+        record["ghost"] = ghost
+    _save_tree_record(tree_data, record)
+
+def save_ghost_restore(tree_data: Dict[str, Any], ghost_id: str) -> None:
+    """Persist the restore of a ghost branch to the journal"""
+    _save_tree_record(tree_data, {"op": "restore_ghost", "ghost_id": ghost_id})
+
+def save_ghost_delete(tree_data: Dict[str, Any], ghost_id: str) -> None:
+    """Persist the deletion of a ghost branch to the journal"""
+    _save_tree_record(tree_data, {"op": "delete_ghost", "ghost_id": ghost_id})
+
+def flush_tree_memory() -> None:
+    """Wait until all scheduled tree saves have reached the disk"""
+    tree_writer.flush()
+
+def _context_path(tree_data: Dict[str, Any], node_id: str) -> List[str]:
+    """Return the ids of the last CONTEXT_MAX_LINES nodes leading to node_id.
+    
+    Every node contributes at least one line of context, so no more nodes than
+    that are ever needed and the walk stops there instead of at the root.
+    """
+    use_cache = tree_data is _TREE_CACHE
+    if use_cache:
+        cached = _cache_get(_PATH_CACHE, node_id)
+        if cached is not None:
+            return cached
+    
+    nodes = tree_data["nodes"]
     path = []
     current_id = node_id
     
-    while current_id:
-        if current_id in tree_data["nodes"]:
-            node = tree_data["nodes"][current_id]
-            path.append(node)
-            current_id = node.get("parent_id")
-        else:
+    while current_id and len(path) < CONTEXT_MAX_LINES:
+        node = nodes.get(current_id)
+        if node is None:
             break
+        path.append(current_id)
+        current_id = node.get("parent_id")
     
     path.reverse()  # Start from root
     
-    # Build context string
+    if use_cache:
+        _cache_put(_PATH_CACHE, node_id, path)
+    return path
+
+def _context_lines(node: Dict[str, Any]) -> List[str]:
+    """Render the context lines contributed by a single node"""
+    lines = []
+    if node["user_input"]:
+        lines.append(f"Human: {node['user_input']}")
+    if node["ai_response"]:
+        lines.append(f"Assistant: {node['ai_response']}")
+    return lines
+
+def _remember_context(parent_id: Optional[str], node: Dict[str, Any]) -> None:
+    """Derive a new node's cached context path and text from its parent's"""
+    node_id = node["id"]
+    if not parent_id:
+        _cache_put(_PATH_CACHE, node_id, [node_id])
+        lines = _context_lines(node)[-CONTEXT_MAX_LINES:]
+        _cache_put(_CONTEXT_CACHE, node_id, (lines, "\n".join(lines)))
+        return
+    parent_path = _cache_get(_PATH_CACHE, parent_id)
+    if parent_path is not None:
+        _cache_put(_PATH_CACHE, node_id, (parent_path + [node_id])[-CONTEXT_MAX_LINES:])
+    parent_context = _cache_get(_CONTEXT_CACHE, parent_id)
+    if parent_context is not None:
+        lines = (parent_context[0] + _context_lines(node))[-CONTEXT_MAX_LINES:]
+        _cache_put(_CONTEXT_CACHE, node_id, (lines, "\n".join(lines)))
+
+def _forget_context(node_id: str) -> None:
+    """Drop the cached context of a node that was edited or removed"""
+    _PATH_CACHE.pop(node_id, None)
+    _CONTEXT_CACHE.pop(node_id, None)
+
+def build_conversation_context(tree_data: Dict[str, Any], node_id: str) -> str:
+    """Build conversation context from root to specified node"""
+    if not node_id or node_id not in tree_data["nodes"]:
+        return ""
+    
+    use_cache = tree_data is _TREE_CACHE
+    if use_cache:
+        cached = _cache_get(_CONTEXT_CACHE, node_id)
+        if cached is not None:
+            return cached[1]
+    
+    # Collect context lines walking back from the node, formatting only the
+    # lines that are kept, then put them back in conversation order
+    nodes = tree_data["nodes"]
     context_parts = []
-    for node in path:
-        if node["user_input"]:
-            context_parts.append(f"Human: {node['user_input']}")
+    for path_id in reversed(_context_path(tree_data, node_id)):
+        node = nodes[path_id]
         if node["ai_response"]:
             context_parts.append(f"Assistant: {node['ai_response']}")
+        if node["user_input"] and len(context_parts) < CONTEXT_MAX_LINES:
+            context_parts.append(f"Human: {node['user_input']}")
+        if len(context_parts) >= CONTEXT_MAX_LINES:
+            break
+    context_parts.reverse()
     
-    return "\n".join(context_parts[-10:])  # Last 10 exchanges
+    context = "\n".join(context_parts)
+    if use_cache:
+        _cache_put(_CONTEXT_CACHE, node_id, (context_parts, context))
+    return context
 
-def create_ghost_branch(tree_data: Dict[str, Any], node_id: str, reason: str = "Node edited") -> str:
-    """Create a ghost branch preserving the subtree from node_id"""
+def _collect_subtree(nodes: Dict[str, Any], node_id: str) -> Dict[str, Any]:
+    """Return node_id and all its descendants, in pre-order, by reference.
+    
+    The subtree is walked with an explicit stack, so depth is unlimited and
+    cycles in a damaged tree are harmless.
+    """
+    subtree = {}
+    stack = [node_id]
+    while stack:
+        current_id = stack.pop()
+        if current_id in subtree:
+            continue
+        node = nodes.get(current_id)
+        if node is None:
+            continue
+        subtree[current_id] = node
+        # Reversed so nodes come out in the same pre-order as a recursive walk
+        stack.extend(reversed(node.get("children", [])))
+    return subtree
+
+def _snapshot_subtree(nodes: Dict[str, Any], node_id: str) -> Dict[str, Any]:
+    """Return independent copies of node_id and all its descendants.
+    
+    The nodes are copied in a single orjson round trip rather than a
+    copy.deepcopy per node.
+    """
+    return orjson.loads(orjson.dumps(_collect_subtree(nodes, node_id)))
+
+def _detach_subtree(tree_data: Dict[str, Any], node_id: str) -> Dict[str, Any]:
+    """Move the descendants of node_id out of the tree and return the subtree.
+    
+    Only node_id itself, which stays in the tree, is copied; its descendants
+    are handed over as they are, since nothing else refers to them anymore.
+    """
+    nodes = tree_data["nodes"]
+    subtree = _collect_subtree(nodes, node_id)
+    for desc_id in subtree:
+        if desc_id != node_id:
+            del nodes[desc_id]
+            _forget_context(desc_id)
+    subtree[node_id] = orjson.loads(orjson.dumps(nodes[node_id]))
+    nodes[node_id]["children"] = []
+    return subtree
+
+def create_ghost_branch(tree_data: Dict[str, Any], node_id: str, reason: str = "Node edited",
+                        detach: bool = False) -> str:
+    """Create a ghost branch preserving the subtree from node_id.
+    
+    With detach=True the descendants are moved into the ghost instead of
+    copied, leaving node_id without children in the tree.
+    """
     if node_id not in tree_data["nodes"]:
         return None
     
@@ -383,42 +765,27 @@ def create_ghost_branch(tree_data: Dict[str, Any], node_id: str, reason: str = "
         tree_data["ghost_branches"] = {}
     
     # Create ghost branch ID
-    ghost_id = f"ghost_{node_id}_{str(uuid.uuid4())[:8]}"
+    ghost_id = f"ghost_{node_id}_{_new_id(4)}"
     
     # Deep copy the entire subtree
     ghost_branch = {
         "id": ghost_id,
         "original_node_id": node_id,
-        "created_at": datetime.datetime.utcnow().isoformat(),
+        "created_at": _utc_timestamp(),
         "reason": reason,
         "nodes": {},
         "root_id": node_id
     }
     
-    # Recursively copy all descendant nodes
-    def copy_subtree(current_id: str, visited: set = None):
-        if visited is None:
-            visited = set()
-        
-        if current_id in visited or current_id not in tree_data["nodes"]:
-            return
-            
-        visited.add(current_id)
-        
-        # Copy the node
-        original_node = tree_data["nodes"][current_id]
-        ghost_branch["nodes"][current_id] = copy.deepcopy(original_node)
-        
-        # Copy all children
-        for child_id in original_node.get("children", []):
-            copy_subtree(child_id, visited)
-    
-    copy_subtree(node_id)
+    if detach:
+        ghost_branch["nodes"] = _detach_subtree(tree_data, node_id)
+    else:
+        ghost_branch["nodes"] = _snapshot_subtree(tree_data["nodes"], node_id)
     
     # Store the ghost branch
     tree_data["ghost_branches"][ghost_id] = ghost_branch
     
-    logger.info(f"Created ghost branch {ghost_id} preserving subtree from {node_id}")
+    logger.info("Created ghost branch %s preserving subtree from %s", ghost_id, node_id)
     return ghost_id
 
 def remove_subtree(tree_data: Dict[str, Any], node_id: str, preserve_root: bool = True):
@@ -426,21 +793,11 @@ def remove_subtree(tree_data: Dict[str, Any], node_id: str, preserve_root: bool
     if node_id not in tree_data["nodes"]:
         return
     
-    # Get all descendants
-    descendants = []
-    
-    def collect_descendants(current_id: str):
-        if current_id in tree_data["nodes"]:
-            for child_id in tree_data["nodes"][current_id].get("children", []):
-                descendants.append(child_id)
-                collect_descendants(child_id)
-    
-    collect_descendants(node_id)
-    
     # Remove descendants
-    for desc_id in descendants:
-        if desc_id in tree_data["nodes"]:
+    for desc_id in _collect_subtree(tree_data["nodes"], node_id):
+        if desc_id != node_id:
             del tree_data["nodes"][desc_id]
+            _forget_context(desc_id)
     
     # Clear children of the root node
     if preserve_root and node_id in tree_data["nodes"]:
@@ -453,21 +810,187 @@ def remove_subtree(tree_data: Dict[str, Any], node_id: str, preserve_root: bool
             if node_id in parent_children:
                 parent_children.remove(node_id)
         del tree_data["nodes"][node_id]
+        _forget_context(node_id)
+
+def _edit_node(tree_data: Dict[str, Any], node_id: str, user_input: Optional[str],
+               ai_response: Optional[str], create_ghost: bool) -> Dict[str, Any]:
+    """Edit an existing node, ghosting or dropping its children, and save.
+    
+    Empty user_input/ai_response leave that field unchanged. Returns the
+    ghost branch id and what happened to the node's children.
+    """
+    node = tree_data["nodes"][node_id]
+    has_children = len(node.get("children", [])) > 0
+    
+    ghost_id = None
+    
+    # Move the children into a ghost branch if requested, otherwise
+    # remove them (to maintain consistency)
+    if has_children and create_ghost:
+        ghost_id = create_ghost_branch(tree_data, node_id, "Node edited - preserving original branch",
+                                       detach=True)
+    elif has_children:
+        remove_subtree(tree_data, node_id, preserve_root=True)
+    
+    # Update the node content
+    if user_input:
+        node["user_input"] = user_input
+    if ai_response:
+        node["ai_response"] = ai_response
+    _forget_context(node_id)
+    
+    # Update timestamp
+    timestamp = _utc_timestamp()
+    node["last_edited"] = timestamp
+    record_edit(node_id, node, {
+        "timestamp": timestamp,
+        "changes": {
+            "user_input": user_input if user_input else None,
+            "ai_response": ai_response if ai_response else None
+        },
+        "ghost_created": ghost_id
+    })
+    
+    # Only the node is journaled, plus the ghost holding its old subtree
+    save_node_edit(tree_data, node, tree_data["ghost_branches"][ghost_id] if ghost_id else None)
+    
+    logger.info("Node %s edited successfully. Ghost branch: %s", node_id, ghost_id)
+    return {
+        "ghost_branch_id": ghost_id,
+        "children_removed": has_children and not create_ghost,
+        "children_ghosted": has_children and create_ghost
+    }
+
+def _restore_ghost(tree_data: Dict[str, Any], ghost_id: str) -> None:
+    """Put a ghost branch back under its original node and drop the ghost"""
+    _restore_ghost_nodes(tree_data, ghost_id)
+    save_ghost_restore(tree_data, ghost_id)
+    logger.info("Ghost branch %s restored successfully", ghost_id)
+
+def _restore_ghost_nodes(tree_data: Dict[str, Any], ghost_id: str) -> None:
+    """Move a ghost branch's nodes back into the tree and drop the ghost"""
+    ghost_branch = tree_data["ghost_branches"][ghost_id]
+    original_node_id = ghost_branch["original_node_id"]
+    
+    # Restore all nodes from ghost branch in a single update; the ghost
+    # is discarded below, so its root copy can be popped rather than
+    # filtered out (don't overwrite the edited original)
+    ghost_nodes = ghost_branch["nodes"]
+    ghost_root = ghost_nodes.pop(original_node_id, {})
+    tree_data["nodes"].update(ghost_nodes)
+    
+    # Restore children relationship to original node
+    original_node = tree_data["nodes"][original_node_id]
+    original_node["children"] = ghost_root.get("children", [])
+    
+    # Remove the ghost branch
+    del tree_data["ghost_branches"][ghost_id]
+
+def _delete_ghost(tree_data: Dict[str, Any], ghost_id: str) -> None:
+    """Permanently drop a ghost branch"""
+    del tree_data["ghost_branches"][ghost_id]
+    save_ghost_delete(tree_data, ghost_id)
+    logger.info("Ghost branch %s deleted permanently", ghost_id)
+
+def record_edit(node_id: str, node: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    """Append entry to a node's edit history, keeping the last EDIT_HISTORY_MAX.
+    
+    Older entries are appended to the tree's edits log (one JSON record per
+    line, never compacted or rotated), so the node, and every save that
+    includes it, stays a bounded size without losing history.
+    """
+    history = node.setdefault("edit_history", [])
+    history.append(entry)
+    if len(history) > EDIT_HISTORY_MAX:
+        dropped = history[:-EDIT_HISTORY_MAX]
+        del history[:-EDIT_HISTORY_MAX]
+        payload = b"".join(orjson.dumps({"node_id": node_id, "entry": e}) + b"\n" for e in dropped)
+        try:
+            _append_file(_edits_path(TREE_MEMORY_FILE), payload)
+        except OSError as e:
+            logger.error("Failed to archive edit history of node %s: %s", node_id, e)
+
+def evict_oldest_leaves(tree_data: Dict[str, Any], max_nodes: int, slack: int = 0) -> int:
+    """Evict the oldest leaf nodes once the tree holds more than max_nodes.
+    
+    Evicts until the tree is back at max_nodes, or slack nodes below it; a
+    slack makes the scan for leaves (and the full save that follows) happen
+    once per batch of new nodes rather than on every turn past the cap. A
+    parent whose last child is evicted becomes a leaf itself and competes by
+    its own timestamp. Returns the number of nodes removed.
+    """
+    nodes = tree_data["nodes"]
+    if len(nodes) <= max_nodes:
+        return 0
+    
+    target = max(max_nodes - slack, 0)
+    leaves = [(node.get("timestamp", ""), node_id) for node_id, node in nodes.items() if not node.get("children")]
+    heapq.heapify(leaves)
+    
+    evicted = 0
+    while len(nodes) > target and leaves:
+        _, node_id = heapq.heappop(leaves)
+        node = nodes.pop(node_id, None)
+        if node is None:
+            continue
+        _forget_context(node_id)
+        evicted += 1
+        if tree_data.get("root_id") == node_id:
+            tree_data["root_id"] = None
+        
+        parent = nodes.get(node.get("parent_id")) if node.get("parent_id") else None
+        if parent is not None:
+            children = parent.get("children", [])
+            if node_id in children:
+                children.remove(node_id)
+            if not children:
+                heapq.heappush(leaves, (parent.get("timestamp", ""), node["parent_id"]))
+    return evicted
+
+def log_ollama_status() -> None:
+    """Log whether Ollama is reachable, as a hint for the user at startup"""
+    if check_ollama_connection():
+        logger.info("✅ Ollama is connected and ready!")
+    else:
+        logger.warning("⚠️  Ollama is not responding. Please start Ollama for full functionality.")
+
+# (checked_at, connected) of the last connection check, so bursts of
+# /api/status polls do not each hit Ollama
+_ollama_status: Tuple[float, bool] = (float('-inf'), False)
 
 def check_ollama_connection() -> bool:
     """Check if Ollama is available and responding"""
+    global _ollama_status
+    checked_at, connected = _ollama_status
+    now = time.monotonic()
+    if now - checked_at < OLLAMA_STATUS_TTL:
+        return connected
+    
     try:
-        response = requests.get("http://127.0.0.1:11434/api/tags", timeout=5)
-        return response.status_code == 200
+        response = get_ollama_session().get(OLLAMA_TAGS_URL, timeout=5)
+        connected = response.status_code == 200
     except requests.RequestException:
-        return False
+        connected = False
+    _ollama_status = (now, connected)
+    return connected
+
+# (fetched_at, models) of the last successful model listing. The list rarely
+# changes, and chat turns that pick a model validate against it every time.
+# The names are kept as a set so validating a requested model is one probe.
+_models_cache: Tuple[float, List[Dict[str, Any]], FrozenSet[str]] = (float('-inf'), [], frozenset())
 
 def get_available_models() -> List[Dict[str, Any]]:
     """Get list of available Ollama models"""
+    global _models_cache
+    fetched_at, models, _ = _models_cache
+    now = time.monotonic()
+    if now - fetched_at < OLLAMA_MODELS_TTL:
+        return models
+    
     try:
-        response = requests.get("http://127.0.0.1:11434/api/tags", timeout=10)
+        response = get_ollama_session().get(OLLAMA_TAGS_URL, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         # Extract model information
         models = []
@@ -481,14 +1004,23 @@ def get_available_models() -> List[Dict[str, Any]]:
         
         # Sort by name for consistent ordering
         models.sort(key=lambda x: x['name'])
+        _models_cache = (now, models, frozenset(model['name'] for model in models))
         return models
     except requests.RequestException as e:
-        logger.error(f"Error fetching models from Ollama: {e}")
+        logger.error("Error fetching models from Ollama: %s", e)
         return []
-    except (json.JSONDecodeError, KeyError) as e:
-        logger.error(f"Error parsing models response: {e}")
+    except (orjson.JSONDecodeError, KeyError) as e:
+        logger.error("Error parsing models response: %s", e)
         return []
 
+def get_available_model_names() -> FrozenSet[str]:
+    """Get the names of the available Ollama models"""
+    models = get_available_models()
+    _, cached_models, names = _models_cache
+    if models is cached_models:
+        return names
+    return frozenset(model['name'] for model in models)
+
 @app.route('/')
 def index():
     """Serve the main interface"""
@@ -499,19 +1031,19 @@ def get_models():
     """Get available Ollama models"""
     try:
         models = get_available_models()
-        return jsonify({
+        return _json_response({
             "models": models,
             "default_model": OLLAMA_MODEL,
             "count": len(models)
         })
     except Exception as e:
-        logger.error(f"Error in models endpoint: {e}")
-        return jsonify({
+        logger.error("Error in models endpoint: %s", e)
+        return _json_response({
             "error": "Failed to fetch models",
             "models": [],
             "default_model": OLLAMA_MODEL,
             "count": 0
-        }), 500
+        }, 500)
 
 @app.route('/api/status', methods=['GET'])
 def status():
@@ -520,20 +1052,20 @@ def status():
         ollama_connected = check_ollama_connection()
         models = get_available_models() if ollama_connected else []
         
-        return jsonify({
+        return _json_response({
             "status": "running",
             "ollama_connected": ollama_connected,
             "model": OLLAMA_MODEL,
             "available_models": len(models),
-            "timestamp": datetime.datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         })
     except Exception as e:
-        logger.error(f"Error in status endpoint: {e}")
-        return jsonify({
+        logger.error("Error in status endpoint: %s", e)
+        return _json_response({
             "status": "error",
             "ollama_connected": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/api/tokenize', methods=['POST'])
@@ -542,19 +1074,19 @@ def tokenize():
     try:
         data = request.get_json()
         if not data or not data.get('prompt'):
-            return jsonify({"error": "Prompt is required"}), 400
+            return _error_response("Prompt is required", 400)
 
         prompt = data['prompt']
         model = data.get('model', OLLAMA_MODEL)
 
         tokens = tokenize_prompt(prompt, model=model)
-        return jsonify({"tokens": tokens})
+        return _json_response({"tokens": tokens})
     except OllamaConnectionError as e:
-        logger.error(f"Ollama connection error during tokenization: {e}")
-        return jsonify({"error": str(e)}), 503
+        logger.error("Ollama connection error during tokenization: %s", e)
+        return _json_response({"error": str(e)}, 503)
     except Exception as e:
-        logger.error(f"Error in tokenize endpoint: {e}")
-        return jsonify({"error": "Failed to tokenize prompt"}), 500
+        logger.error("Error in tokenize endpoint: %s", e)
+        return _error_response("Failed to tokenize prompt", 500)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -562,109 +1094,119 @@ def chat():
     try:
         data = request.get_json()
         if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
+            return _error_response("No JSON data provided", 400)
             
         user_input = data.get('message', '').strip()
         parent_id = data.get('parent_id')  # Node to branch from
         selected_model = data.get('model', OLLAMA_MODEL)  # Allow model selection
         
         if not user_input:
-            return jsonify({"error": "Message cannot be empty"}), 400
+            return _error_response("Message cannot be empty", 400)
         
         # Check if message is too long
         if len(user_input) > 5000:
-            return jsonify({"error": "Message too long (max 5000 characters)"}), 400
+            return _error_response("Message too long (max 5000 characters)", 400)
         
         # Validate selected model
         if selected_model:
-            available_models = get_available_models()
-            model_names = [model['name'] for model in available_models]
-            if selected_model not in model_names and available_models:  # Only validate if we can get models
-                logger.warning(f"Requested model '{selected_model}' not available, using default")
+            model_names = get_available_model_names()
+            if model_names and selected_model not in model_names:  # Only validate if we can get models
+                logger.warning("Requested model '%s' not available, using default", selected_model)
                 selected_model = OLLAMA_MODEL
         
-        # Load conversation tree
-        tree_data = load_tree_memory()
-        
-        # Build context from conversation path
-        context = build_conversation_context(tree_data, parent_id) if parent_id else ""
+        # Build context from conversation path. The tree lock is only held
+        # for in-memory reads and updates, never across the model call, so
+        # turns on any branches run their Ollama queries concurrently.
+        with _TREE_LOCK:
+            tree_data = load_tree_memory()
+            context = build_conversation_context(tree_data, parent_id) if parent_id else ""
         
         # Create enhanced prompt with context
         if context:
-            full_prompt = f"""You are an autonomous language model. Here's our conversation so far:
-
-{context}
-
-Now respond to: {user_input}"""
+            full_prompt = "".join((PROMPT_CONTEXT_HEADER, context, PROMPT_CONTEXT_QUESTION, user_input))
         else:
-            full_prompt = f"You are an autonomous language model. Respond to: {user_input}"
+            full_prompt = PROMPT_NO_CONTEXT + user_input
         
-        logger.info(f"Processing chat request from {request.remote_addr} using model: {selected_model}")
+        logger.info("Processing chat request from %s using model: %s", request.remote_addr, selected_model)
         
         # Query the ALM with selected model
         response = query_ollama(full_prompt, model=selected_model)
         
         # Create new node
-        new_node_id = str(uuid.uuid4())
+        new_node_id = _new_id()
+        timestamp = _utc_timestamp()
         new_node = {
             "id": new_node_id,
             "user_input": user_input,
             "ai_response": response,
             "parent_id": parent_id,
             "model_used": selected_model,  # Store which model was used
-            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "timestamp": timestamp,
             "children": []
         }
         
-        # Update conversation tree
-        tree_data["nodes"][new_node_id] = new_node
-        
-        # Update parent's children list
-        if parent_id and parent_id in tree_data["nodes"]:
-            if "children" not in tree_data["nodes"][parent_id]:
-                tree_data["nodes"][parent_id]["children"] = []
-            tree_data["nodes"][parent_id]["children"].append(new_node_id)
-        else:
-            # This is a root node
-            tree_data["root_id"] = new_node_id
-        
-        # Save tree
-        save_tree_memory(tree_data)
+        # Update conversation tree. The tree is fetched again because it may
+        # have been reset or replaced while we were waiting on Ollama.
+        with _TREE_LOCK:
+            tree_data = load_tree_memory()
+            tree_data["nodes"][new_node_id] = new_node
+            
+            # Update parent's children list
+            parent = tree_data["nodes"].get(parent_id) if parent_id else None
+            if parent is not None:
+                parent.setdefault("children", []).append(new_node_id)
+                _remember_context(parent_id, new_node)
+            else:
+                # This is a root node
+                tree_data["root_id"] = new_node_id
+                _remember_context(None, new_node)
+            
+            evicted = evict_oldest_leaves(tree_data, TREE_MAX_NODES, TREE_EVICT_SLACK)
+            if evicted:
+                logger.info("Evicted %s old nodes to stay under %s", evicted, TREE_MAX_NODES)
+                save_tree_memory(tree_data)
+            else:
+                # Journal the new node rather than rewriting the whole tree
+                save_tree_node(tree_data, new_node)
         
-        logger.info(f"Chat completed successfully for node {new_node_id}")
+        logger.info("Chat completed successfully for node %s", new_node_id)
         
-        return jsonify({
+        return _json_response({
             "node_id": new_node_id,
             "response": response,
             "model_used": selected_model,
-            "timestamp": new_node["timestamp"]
+            "timestamp": timestamp
         })
         
     except OllamaConnectionError as e:
-        logger.error(f"Ollama connection error: {e}")
-        return jsonify({
+        logger.error("Ollama connection error: %s", e)
+        return _json_response({
             "error": f"Ollama connection error: {str(e)}",
             "suggestion": "Please check that Ollama is running and accessible"
-        }), 503
+        }, 503)
     except MemoryError as e:
-        logger.error(f"Memory error: {e}")
-        return jsonify({"error": f"Memory error: {str(e)}"}), 500
+        logger.error("Memory error: %s", e)
+        return _json_response({"error": f"Memory error: {str(e)}"}, 500)
     except ValueError as e:
-        logger.error(f"Validation error: {e}")
-        return jsonify({"error": str(e)}), 400
+        logger.error("Validation error: %s", e)
+        return _json_response({"error": str(e)}, 400)
     except Exception as e:
-        logger.error(f"Unexpected error in chat: {e}")
-        return jsonify({"error": "An unexpected error occurred"}), 500
+        logger.error("Unexpected error in chat: %s", e)
+        return _error_response("An unexpected error occurred", 500)
 
 @app.route('/api/tree', methods=['GET'])
 def get_tree():
     """Get the current conversation tree"""
     try:
-        tree_data = load_tree_memory()
-        return jsonify(tree_data)
+        payload, etag = _serialize_tree(load_tree_memory())
+        response = app.response_class(payload, mimetype='application/json')
+        response.set_etag(etag)
+        # Make clients revalidate; unchanged trees then cost a 304 and no body
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
-        logger.error(f"Error getting tree: {e}")
-        return jsonify({"error": "Failed to load conversation tree"}), 500
+        logger.error("Error getting tree: %s", e)
+        return _error_response("Failed to load conversation tree", 500)
 
 @app.route('/api/tree/reset', methods=['POST'])
 def reset_tree():
@@ -673,33 +1215,35 @@ def reset_tree():
         tree_data = {"nodes": {}, "root_id": None}
         save_tree_memory(tree_data)
         logger.info("Conversation tree reset")
-        return jsonify({"success": True, "message": "Tree reset successfully"})
+        return _json_response({"success": True, "message": "Tree reset successfully"})
     except Exception as e:
-        logger.error(f"Error resetting tree: {e}")
-        return jsonify({"error": "Failed to reset conversation tree"}), 500
+        logger.error("Error resetting tree: %s", e)
+        return _error_response("Failed to reset conversation tree", 500)
 
 @app.route('/api/node/<node_id>', methods=['GET'])
 def get_node(node_id):
     """Get details of a specific node"""
     try:
         if not node_id:
-            return jsonify({"error": "Node ID is required"}), 400
+            return _error_response("Node ID is required", 400)
             
-        tree_data = load_tree_memory()
-        if node_id in tree_data["nodes"]:
-            return jsonify(tree_data["nodes"][node_id])
-        else:
-            return jsonify({"error": "Node not found"}), 404
+        # A single lookup in the in-memory node index; the tree file is not
+        # touched once loaded
+        with _TREE_LOCK:
+            node = load_tree_memory()["nodes"].get(node_id)
+            if node is not None:
+                return _json_response(node)
+        return _error_response("Node not found", 404)
     except Exception as e:
-        logger.error(f"Error getting node {node_id}: {e}")
-        return jsonify({"error": "Failed to get node details"}), 500
+        logger.error("Error getting node %s: %s", node_id, e)
+        return _error_response("Failed to get node details", 500)
 
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({
+    return _json_response({
         "status": "healthy",
-        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "timestamp": _utc_timestamp(),
         "version": "1.0.0"
     })
 
@@ -708,193 +1252,136 @@ def edit_node(node_id):
     """Edit a specific node's content"""
     try:
         if not node_id:
-            return jsonify({"error": "Node ID is required"}), 400
+            return _error_response("Node ID is required", 400)
             
         data = request.get_json()
         if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
+            return _error_response("No JSON data provided", 400)
         
         new_user_input = data.get('user_input', '').strip()
         new_ai_response = data.get('ai_response', '').strip()
         create_ghost = data.get('create_ghost', False)
         
         if not new_user_input and not new_ai_response:
-            return jsonify({"error": "At least one of user_input or ai_response must be provided"}), 400
-        
-        # Load tree
-        tree_data = load_tree_memory()
-        
-        if node_id not in tree_data["nodes"]:
-            return jsonify({"error": "Node not found"}), 404
-        
-        node = tree_data["nodes"][node_id]
-        has_children = len(node.get("children", [])) > 0
-        
-        ghost_id = None
-        
-        # Create ghost branch if requested and node has children
-        if create_ghost and has_children:
-            ghost_id = create_ghost_branch(tree_data, node_id, "Node edited - preserving original branch")
-        
-        # Remove children if not creating ghost (to maintain consistency)
-        if has_children and not create_ghost:
-            remove_subtree(tree_data, node_id, preserve_root=True)
-        elif has_children and create_ghost:
-            # Still remove children from the original tree since we ghosted them
-            remove_subtree(tree_data, node_id, preserve_root=True)
-        
-        # Update the node content
-        if new_user_input:
-            node["user_input"] = new_user_input
-        if new_ai_response:
-            node["ai_response"] = new_ai_response
-        
-        # Update timestamp
-        node["last_edited"] = datetime.datetime.utcnow().isoformat()
-        node["edit_history"] = node.get("edit_history", [])
-        node["edit_history"].append({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "changes": {
-                "user_input": new_user_input if new_user_input else None,
-                "ai_response": new_ai_response if new_ai_response else None
-            },
-            "ghost_created": ghost_id
-        })
-        
-        # Save tree
-        save_tree_memory(tree_data)
-        
-        logger.info(f"Node {node_id} edited successfully. Ghost branch: {ghost_id}")
-        
-        return jsonify({
-            "success": True,
-            "message": "Node edited successfully",
-            "ghost_branch_id": ghost_id,
-            "children_removed": has_children and not create_ghost,
-            "children_ghosted": has_children and create_ghost
-        })
+            return _error_response("At least one of user_input or ai_response must be provided", 400)
         
+        with _TREE_LOCK:
+            tree_data = load_tree_memory()
+            
+            if node_id not in tree_data["nodes"]:
+                return _error_response("Node not found", 404)
+            
+            result = _edit_node(tree_data, node_id, new_user_input, new_ai_response, create_ghost)
+            
+            return _json_response({
+                "success": True,
+                "message": "Node edited successfully",
+                **result
+            })
+            
     except Exception as e:
-        logger.error(f"Error editing node {node_id}: {e}")
-        return jsonify({"error": "Failed to edit node"}), 500
+        logger.error("Error editing node %s: %s", node_id, e)
+        return _error_response("Failed to edit node", 500)
 
 @app.route('/api/ghost-branches', methods=['GET'])
 def get_ghost_branches():
     """Get all ghost branches"""
     try:
-        tree_data = load_tree_memory()
-        ghost_branches = tree_data.get("ghost_branches", {})
-        
-        # Format ghost branches for frontend
-        formatted_branches = {}
-        for ghost_id, branch in ghost_branches.items():
-            formatted_branches[ghost_id] = {
-                "id": ghost_id,
-                "original_node_id": branch["original_node_id"],
-                "created_at": branch["created_at"],
-                "reason": branch["reason"],
-                "node_count": len(branch["nodes"]),
-                "root_content": branch["nodes"].get(branch["root_id"], {}).get("user_input", "")[:50] + "..."
-            }
-        
-        return jsonify(formatted_branches)
+        with _TREE_LOCK:
+            tree_data = load_tree_memory()
+            ghost_branches = tree_data.get("ghost_branches", {})
+            
+            # Format ghost branches for frontend
+            formatted_branches = {}
+            for ghost_id, branch in ghost_branches.items():
+                formatted_branches[ghost_id] = {
+                    "id": ghost_id,
+                    "original_node_id": branch["original_node_id"],
+                    "created_at": branch["created_at"],
+                    "reason": branch["reason"],
+                    "node_count": len(branch["nodes"]),
+                    "root_content": branch["nodes"].get(branch["root_id"], {}).get("user_input", "")[:50] + "..."
+                }
+            
+            return _json_response(formatted_branches)
     except Exception as e:
-        logger.error(f"Error getting ghost branches: {e}")
-        return jsonify({"error": "Failed to load ghost branches"}), 500
+        logger.error("Error getting ghost branches: %s", e)
+        return _error_response("Failed to load ghost branches", 500)
 
 @app.route('/api/ghost-branches/<ghost_id>', methods=['GET'])
 def get_ghost_branch_details(ghost_id):
     """Get detailed information about a specific ghost branch"""
     try:
-        tree_data = load_tree_memory()
-        
-        if ghost_id not in tree_data.get("ghost_branches", {}):
-            return jsonify({"error": "Ghost branch not found"}), 404
-        
-        return jsonify(tree_data["ghost_branches"][ghost_id])
+        with _TREE_LOCK:
+            tree_data = load_tree_memory()
+            
+            if ghost_id not in tree_data.get("ghost_branches", {}):
+                return _error_response("Ghost branch not found", 404)
+            
+            return _json_response(tree_data["ghost_branches"][ghost_id])
     except Exception as e:
-        logger.error(f"Error getting ghost branch {ghost_id}: {e}")
-        return jsonify({"error": "Failed to load ghost branch"}), 500
+        logger.error("Error getting ghost branch %s: %s", ghost_id, e)
+        return _error_response("Failed to load ghost branch", 500)
 
 @app.route('/api/ghost-branches/<ghost_id>/restore', methods=['POST'])
 def restore_ghost_branch(ghost_id):
     """Restore a ghost branch back to the main tree"""
     try:
-        tree_data = load_tree_memory()
-        
-        if ghost_id not in tree_data.get("ghost_branches", {}):
-            return jsonify({"error": "Ghost branch not found"}), 404
-        
-        ghost_branch = tree_data["ghost_branches"][ghost_id]
-        
-        # Check if the original node still exists
-        original_node_id = ghost_branch["original_node_id"]
-        if original_node_id not in tree_data["nodes"]:
-            return jsonify({"error": "Original node no longer exists, cannot restore"}), 400
-        
-        # Restore all nodes from ghost branch
-        for node_id, node_data in ghost_branch["nodes"].items():
-            if node_id != original_node_id:  # Don't overwrite the edited original
-                tree_data["nodes"][node_id] = node_data
-        
-        # Restore children relationship to original node
-        original_node = tree_data["nodes"][original_node_id]
-        ghost_root = ghost_branch["nodes"][original_node_id]
-        original_node["children"] = ghost_root.get("children", [])
-        
-        # Remove the ghost branch
-        del tree_data["ghost_branches"][ghost_id]
-        
-        # Save tree
-        save_tree_memory(tree_data)
-        
-        logger.info(f"Ghost branch {ghost_id} restored successfully")
-        
-        return jsonify({
-            "success": True,
-            "message": "Ghost branch restored successfully"
-        })
-        
+        with _TREE_LOCK:
+            tree_data = load_tree_memory()
+            
+            if ghost_id not in tree_data.get("ghost_branches", {}):
+                return _error_response("Ghost branch not found", 404)
+            
+            ghost_branch = tree_data["ghost_branches"][ghost_id]
+            
+            # Check if the original node still exists
+            original_node_id = ghost_branch["original_node_id"]
+            if original_node_id not in tree_data["nodes"]:
+                return _error_response("Original node no longer exists, cannot restore", 400)
+            
+            _restore_ghost(tree_data, ghost_id)
+            
+            return _json_response({
+                "success": True,
+                "message": "Ghost branch restored successfully"
+            })
+            
     except Exception as e:
-        logger.error(f"Error restoring ghost branch {ghost_id}: {e}")
-        return jsonify({"error": "Failed to restore ghost branch"}), 500
+        logger.error("Error restoring ghost branch %s: %s", ghost_id, e)
+        return _error_response("Failed to restore ghost branch", 500)
 
 @app.route('/api/ghost-branches/<ghost_id>', methods=['DELETE'])
 def delete_ghost_branch(ghost_id):
     """Permanently delete a ghost branch"""
     try:
-        tree_data = load_tree_memory()
-        
-        if ghost_id not in tree_data.get("ghost_branches", {}):
-            return jsonify({"error": "Ghost branch not found"}), 404
-        
-        # Remove the ghost branch
-        del tree_data["ghost_branches"][ghost_id]
-        
-        # Save tree
-        save_tree_memory(tree_data)
-        
-        logger.info(f"Ghost branch {ghost_id} deleted permanently")
-        
-        return jsonify({
-            "success": True,
-            "message": "Ghost branch deleted permanently"
-        })
-        
+        with _TREE_LOCK:
+            tree_data = load_tree_memory()
+            
+            if ghost_id not in tree_data.get("ghost_branches", {}):
+                return _error_response("Ghost branch not found", 404)
+            
+            _delete_ghost(tree_data, ghost_id)
+            
+            return _json_response({
+                "success": True,
+                "message": "Ghost branch deleted permanently"
+            })
+            
     except Exception as e:
-        logger.error(f"Error deleting ghost branch {ghost_id}: {e}")
-        return jsonify({"error": "Failed to delete ghost branch"}), 500
+        logger.error("Error deleting ghost branch %s: %s", ghost_id, e)
+        return _error_response("Failed to delete ghost branch", 500)
 
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
-    return jsonify({"error": "Endpoint not found"}), 404
+    return _error_response("Endpoint not found", 404)
 
 @app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
-    logger.error(f"Internal server error: {error}")
-    return jsonify({"error": "Internal server error"}), 500
+    logger.error("Internal server error: %s", error)
+    return _error_response("Internal server error", 500)
 
 if __name__ == '__main__':
     # Get configuration from environment variables
@@ -902,14 +1389,15 @@ if __name__ == '__main__':
     port = int(os.getenv('ALM_PORT', '5001'))
     debug = os.getenv('ALM_DEBUG', 'false').lower() == 'true'
     
-    logger.info(f"Starting ALM web application on {host}:{port}")
-    logger.info(f"Using Ollama model: {OLLAMA_MODEL}")
-    logger.info(f"Ollama URL: {OLLAMA_URL}")
+    logger.info("Starting ALM web application on %s:%s", host, port)
+    logger.info("Using Ollama model: %s", OLLAMA_MODEL)
+    logger.info("Ollama URL: %s", OLLAMA_URL)
     
-    # Check initial Ollama connection
-    if check_ollama_connection():
-        logger.info("✅ Ollama is connected and ready!")
-    else:
-        logger.warning("⚠️  Ollama is not responding. Please start Ollama for full functionality.")
+    # Check initial Ollama connection without holding up startup, which
+    # can otherwise wait for the whole connection timeout
+    threading.Thread(target=log_ollama_status, name="ollama-check", daemon=True).start()
+    
+    # Exit through sys.exit on SIGTERM so atexit flushes pending tree saves
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     
     app.run(debug=debug, host=host, port=port) 
\ No newline at end of file
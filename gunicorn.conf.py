@@ -0,0 +1,14 @@
+"""Gunicorn settings for the web interface (see wsgi.py)"""
+
+import os
+
+bind = f"{os.getenv('ALM_HOST', '0.0.0.0')}:{os.getenv('ALM_PORT', '5001')}"
+
+# The conversation tree is cached in process memory, so a second worker
+# process would serve a diverging copy of it. Concurrency comes from threads.
+workers = 1
+worker_class = "gthread"
+threads = int(os.getenv('ALM_THREADS', '8'))
+
+# Keep browser connections open between the UI's periodic polls
+keepalive = 30
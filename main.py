@@ -1,27 +1,84 @@
+import functools
 import json
 import os
-import datetime
-import requests
+import time
+import orjson
 import logging
-from typing import Dict, List, Any, Optional
+from logging.handlers import RotatingFileHandler
+from typing import TYPE_CHECKING, Dict, Iterator, List, Any, Optional, Tuple
 
-# Configure logging
+# Configure logging. The log file is rotated to bound its size, and only
+# opened on the first record, so importing this module creates no file.
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('alm.log'),
+        RotatingFileHandler('alm.log', maxBytes=10 * 1024 * 1024, backupCount=3, delay=True),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# requests (and urllib3 with it) is most of this module's import time, so it
+# is imported where Ollama is called and the REPL comes up without it
+if TYPE_CHECKING:
+    import requests
+
 OLLAMA_MODEL = "gemma3:4b"
 MEMORY_FILE = "alm_memory.json"
 OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
 MAX_LOG_ENTRIES = 100  # Prevent memory log from growing infinitely
 REQUEST_TIMEOUT = 30  # seconds
 
+# Fixed parts of the prompt; only goals, log and user input vary per turn
+PROMPT_GOALS_HEADER = (
+    "\nYou are an autonomous language model tasked with helping a human achieve their goals.\n\n"
+    "Current Goals:\n"
+)
+PROMPT_LOG_HEADER = "\n\nRecent Interaction Log:\n"
+PROMPT_USER_HEADER = "\n\nHuman said: "
+PROMPT_FOOTER = (
+    "\n\nBased on the goals and history, provide a thoughtful response and optionally "
+    "add or update a goal or memory entry.\n"
+)
+
+
+# Shared HTTP session so repeated calls to Ollama reuse keep-alive connections
+# instead of opening a new socket per request. Created on first use.
+_ollama_session: Optional["requests.Session"] = None
+
+# Request bodies are encoded with orjson and sent as data=, so requests
+# does not run its own stdlib json encode
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+@functools.lru_cache(maxsize=16)
+def _generate_body_prefix(model: str) -> bytes:
+    """Encoded start of a generate request body for model, up to the prompt"""
+    return b'{"model":' + orjson.dumps(model) + b',"prompt":'
+
+
+def _generate_body(model: str, prompt: str, stream: bool) -> bytes:
+    """Encode a generate request body; only the prompt is encoded per call"""
+    return b"".join((
+        _generate_body_prefix(model),
+        orjson.dumps(prompt),
+        b',"stream":true}' if stream else b',"stream":false}'
+    ))
+
+
+def get_ollama_session() -> "requests.Session":
+    """Return the shared HTTP session used to talk to Ollama"""
+    global _ollama_session
+    if _ollama_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        _ollama_session = session
+    return _ollama_session
+
 
 class ALMError(Exception):
     """Base exception for ALM-related errors"""
@@ -38,12 +95,55 @@ class MemoryError(ALMError):
     pass
 
 
+# Log entries appended to each journal since its last full save, so the
+# journal can be folded back into the memory file once it gets long
+_journal_entries: Dict[str, int] = {}
+
+
+def _journal_path() -> str:
+    """Return the journal file holding log entries since the last full save"""
+    return os.path.splitext(MEMORY_FILE)[0] + ".jsonl"
+
+
+def _replay_journal(memory: Dict[str, Any]) -> int:
+    """Append the journaled log entries to memory and return how many there were"""
+    path = _journal_path()
+    count = 0
+    try:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        memory["log"].append(orjson.loads(line))
+                    except orjson.JSONDecodeError:
+                        # A torn last line from an interrupted append
+                        logger.warning("Skipping unreadable memory journal entry")
+                        continue
+                    count += 1
+    except IOError as e:
+        logger.error("Failed to read memory journal: %s", e)
+    return count
+
+
+def _utc_timestamp() -> str:
+    """Return the current UTC time as an ISO 8601 string, to the second"""
+    # time.gmtime() is a plain struct, cheaper than building a datetime
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
 def load_memory() -> Dict[str, Any]:
+    """Load memory from disk, including log entries journaled since the last save"""
+    memory = _read_memory_file()
+    _journal_entries[_journal_path()] = _replay_journal(memory)
+    return memory
+
+
+def _read_memory_file() -> Dict[str, Any]:
     """Load memory from disk with error handling"""
     try:
         if os.path.exists(MEMORY_FILE):
-            with open(MEMORY_FILE, "r", encoding='utf-8') as f:
-                memory = json.load(f)
+            with open(MEMORY_FILE, "rb") as f:
+                memory = orjson.loads(f.read())
                 # Validate memory structure
                 if not isinstance(memory, dict):
                     raise ValueError("Memory file format is invalid")
@@ -54,23 +154,47 @@ def load_memory() -> Dict[str, Any]:
                 return memory
         return {"goals": [], "log": []}
     except (json.JSONDecodeError, IOError, ValueError) as e:
-        logger.error(f"Failed to load memory: {e}")
+        logger.error("Failed to load memory: %s", e)
         logger.info("Creating new memory file")
         return {"goals": [], "log": []}
 
 
-def save_memory(memory: Dict[str, Any]) -> None:
-    """Save memory to disk with error handling"""
+def save_memory(memory: Dict[str, Any], entry: Optional[Dict[str, Any]] = None) -> None:
+    """Save memory to disk with error handling.
+    
+    When entry, the log entry just added to memory, is given it is only
+    appended to the journal; the whole memory file is rewritten once the
+    journal holds MAX_LOG_ENTRIES entries.
+    """
+    path = _journal_path()
     try:
-        # Limit log size to prevent unbounded growth
+        if entry is not None and _journal_entries.get(path, 0) < MAX_LOG_ENTRIES:
+            with open(path, "ab") as f:
+                f.write(orjson.dumps(entry) + b"\n")
+            _journal_entries[path] = _journal_entries.get(path, 0) + 1
+            return
+        
+        # Limit log size to prevent unbounded growth, in place rather than
+        # by copying the kept entries into a new list
         if len(memory["log"]) > MAX_LOG_ENTRIES:
-            memory["log"] = memory["log"][-MAX_LOG_ENTRIES:]
-            logger.info(f"Trimmed memory log to {MAX_LOG_ENTRIES} entries")
+            del memory["log"][:-MAX_LOG_ENTRIES]
+            logger.info("Trimmed memory log to %s entries", MAX_LOG_ENTRIES)
         
-        with open(MEMORY_FILE, "w", encoding='utf-8') as f:
-            json.dump(memory, f, indent=2, ensure_ascii=False)
+        # orjson writes UTF-8 bytes directly, non-ASCII text included. The
+        # file is replaced atomically, so a crash mid-write leaves the old one
+        tmp_path = MEMORY_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(memory, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, MEMORY_FILE)
+        # The journal is now part of the memory file. Removing it only after
+        # the write means a crash in between can repeat entries, never lose them
+        if os.path.exists(path):
+            os.remove(path)
+        _journal_entries[path] = 0
     except (IOError, TypeError) as e:
-        logger.error(f"Failed to save memory: {e}")
+        logger.error("Failed to save memory: %s", e)
         raise MemoryError(f"Could not save memory: {e}")
 
 
@@ -82,14 +206,13 @@ def query_ollama(prompt: str, model: str = OLLAMA_MODEL) -> str:
     if not model.strip():
         model = OLLAMA_MODEL  # Fallback to default
     
+    import requests
+    
     try:
-        response = requests.post(
+        response = get_ollama_session().post(
             OLLAMA_URL,
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False
-            },
+            data=_generate_body(model, prompt, stream=False),
+            headers=JSON_HEADERS,
             timeout=REQUEST_TIMEOUT
         )
         response.raise_for_status()  # Raise exception for bad status codes
@@ -110,6 +233,52 @@ def query_ollama(prompt: str, model: str = OLLAMA_MODEL) -> str:
         raise OllamaConnectionError(f"Invalid response from Ollama: {e}")
 
 
+def query_ollama_stream(prompt: str, model: str = OLLAMA_MODEL) -> Iterator[str]:
+    """Query the local Ollama model, yielding the response as it is generated"""
+    if not prompt.strip():
+        raise ValueError("Prompt cannot be empty")
+    
+    if not model.strip():
+        model = OLLAMA_MODEL  # Fallback to default
+    
+    import requests
+    
+    try:
+        with get_ollama_session().post(
+            OLLAMA_URL,
+            data=_generate_body(model, prompt, stream=True),
+            headers=JSON_HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            
+            # Ollama sends one JSON object per line until one says it is done
+            done = False
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = orjson.loads(line)
+                if "error" in chunk:
+                    raise ValueError(chunk["error"])
+                yield chunk.get("response", "")
+                if chunk.get("done"):
+                    done = True
+                    break
+            if not done:
+                # Connection dropped or body cut off before the final chunk
+                raise OllamaConnectionError("Incomplete response from Ollama")
+    
+    except requests.exceptions.ConnectionError:
+        raise OllamaConnectionError("Could not connect to Ollama server. Is it running?")
+    except requests.exceptions.Timeout:
+        raise OllamaConnectionError(f"Request to Ollama timed out after {REQUEST_TIMEOUT} seconds")
+    except requests.exceptions.RequestException as e:
+        raise OllamaConnectionError(f"Request to Ollama failed: {e}")
+    except (json.JSONDecodeError, KeyError, ValueError) as e:
+        raise OllamaConnectionError(f"Invalid response from Ollama: {e}")
+
+
 def tokenize_prompt(prompt: str, model: str = OLLAMA_MODEL) -> List[Dict[str, Any]]:
     """Return token IDs and probabilities for a prompt using Ollama."""
     if not prompt.strip():
@@ -122,10 +291,13 @@ def tokenize_prompt(prompt: str, model: str = OLLAMA_MODEL) -> List[Dict[str, An
     base_url = OLLAMA_URL.rsplit('/', 1)[0]
     tokenize_url = f"{base_url}/tokenize"
 
+    import requests
+
     try:
-        response = requests.post(
+        response = get_ollama_session().post(
             tokenize_url,
-            json={"model": model, "prompt": prompt},
+            data=orjson.dumps({"model": model, "prompt": prompt}),
+            headers=JSON_HEADERS,
             timeout=REQUEST_TIMEOUT,
         )
         response.raise_for_status()
@@ -143,35 +315,48 @@ def tokenize_prompt(prompt: str, model: str = OLLAMA_MODEL) -> List[Dict[str, An
         raise OllamaConnectionError(f"Invalid response from Ollama: {e}")
 
 
+# The last recent-log window and its formatted lines. Each turn usually adds
+# one entry, so every other line can be reused from the previous prompt
+_recent_log_cache: Tuple[List[Any], Tuple[str, ...]] = ([], ())
+
+
+def _recent_log_lines(recent_log: List[Dict[str, Any]]) -> Tuple[str, ...]:
+    """Return the prompt lines for recent_log, formatting only new entries"""
+    global _recent_log_cache
+    cached_entries, cached_lines = _recent_log_cache
+    # The cache keeps the entries alive, so their ids cannot be reused
+    known = {id(entry): line for entry, line in zip(cached_entries, cached_lines)}
+    lines = tuple(
+        known.get(id(entry))
+        or f"{entry.get('timestamp', 'Unknown')}: {entry.get('user', 'Unknown')}"
+        for entry in recent_log
+    )
+    # recent_log is the prompt's own slice of the log, so it can be kept as is
+    _recent_log_cache = (recent_log, lines)
+    return lines
+
+
 def build_prompt(memory: Dict[str, Any], user_input: str) -> str:
     """Generate prompt from current state"""
     if not user_input.strip():
         raise ValueError("User input cannot be empty")
     
     # Get recent log entries safely
+    # A negative slice copies just the five entries; islice would have to
+    # step through the whole list to reach them
     recent_log = memory.get("log", [])[-5:]
-    past_log = "\n".join(
-        f"{entry.get('timestamp', 'Unknown')}: {entry.get('user', 'Unknown')}" 
-        for entry in recent_log
-    )
+    past_log = "\n".join(_recent_log_lines(recent_log))
     
     # Get goals safely
     goals = memory.get("goals", [])
-    goals_text = "\n".join(f"- {goal}" for goal in goals if goal)
+    goals_text = "\n".join([f"- {goal}" for goal in goals if goal])
     
-    return f"""
-You are an autonomous language model tasked with helping a human achieve their goals.
-
-Current Goals:
-{goals_text or 'No goals yet.'}
-
-Recent Interaction Log:
-{past_log or 'None'}
-
-Human said: {user_input}
-
-Based on the goals and history, provide a thoughtful response and optionally add or update a goal or memory entry.
-"""
+    return "".join((
+        PROMPT_GOALS_HEADER, goals_text or "No goals yet.",
+        PROMPT_LOG_HEADER, past_log or "None",
+        PROMPT_USER_HEADER, user_input,
+        PROMPT_FOOTER
+    ))
 
 
 def main() -> None:
@@ -180,9 +365,9 @@ def main() -> None:
     
     try:
         memory = load_memory()
-        logger.info(f"Loaded memory with {len(memory['goals'])} goals and {len(memory['log'])} log entries")
+        logger.info("Loaded memory with %s goals and %s log entries", len(memory['goals']), len(memory['log']))
     except Exception as e:
-        logger.error(f"Failed to initialize memory: {e}")
+        logger.error("Failed to initialize memory: %s", e)
         return
     
     print("Autonomous Language Model (ALM) is ready. Type 'exit' to quit.")
@@ -199,38 +384,51 @@ def main() -> None:
                 print("Please enter a message.")
                 continue
             
-            logger.info(f"Processing user input: {user_input[:50]}...")
+            logger.info("Processing user input: %s...", user_input[:50])
             
-            # Build prompt and query Ollama
+            # Build prompt and query Ollama, printing the reply as it streams in
             prompt = build_prompt(memory, user_input)
-            response = query_ollama(prompt)
+            parts = []
+            try:
+                for token in query_ollama_stream(prompt):
+                    if not parts:
+                        print("ALM: ", end="", flush=True)
+                    parts.append(token)
+                    print(token, end="", flush=True)
+            finally:
+                if parts:
+                    print("\n")
+            response = "".join(parts)
+            if not response:
+                logger.warning("Ollama returned an empty response")
+                print("No response received from Ollama.")
+                continue
             
             # Log the interaction
-            timestamp = datetime.datetime.utcnow().isoformat()
-            memory["log"].append({
-                "timestamp": timestamp,
+            entry = {
+                "timestamp": _utc_timestamp(),
                 "user": user_input,
                 "model": response
-            })
+            }
+            memory["log"].append(entry)
             
-            # Save memory
-            save_memory(memory)
+            # Save memory; usually just appends the entry to the journal
+            save_memory(memory, entry)
             
-            print(f"ALM: {response.strip()}\n")
             logger.info("Interaction completed successfully")
             
         except KeyboardInterrupt:
             logger.info("User interrupted with Ctrl+C")
             break
         except OllamaConnectionError as e:
-            logger.error(f"Ollama connection error: {e}")
+            logger.error("Ollama connection error: %s", e)
             print(f"Error: {e}")
             print("Please check that Ollama is running and try again.")
         except MemoryError as e:
-            logger.error(f"Memory error: {e}")
+            logger.error("Memory error: %s", e)
             print(f"Error saving memory: {e}")
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
             print(f"An unexpected error occurred: {e}")
     
     print("ALM session ended.")
@@ -3,11 +3,13 @@ import json
 import os
 import tempfile
 import shutil
-from unittest.mock import patch, mock_open, MagicMock
+import subprocess
+import sys
+from unittest.mock import patch, mock_open, MagicMock, ANY
 import requests
 from main import (
-    load_memory, save_memory, query_ollama, build_prompt, main,
-    ALMError, OllamaConnectionError, MemoryError,
+    load_memory, save_memory, query_ollama, query_ollama_stream, build_prompt, main,
+    ALMError, OllamaConnectionError, MemoryError, _generate_body,
     MEMORY_FILE, OLLAMA_MODEL, OLLAMA_URL, REQUEST_TIMEOUT
 )
 
@@ -97,6 +99,17 @@ class TestMemoryOperations(unittest.TestCase):
         
         self.assertEqual(saved_data, test_memory)
     
+    def test_save_memory_round_trips_unicode(self):
+        """Test that non-ASCII text is saved as UTF-8 and loads back unchanged"""
+        test_memory = {"goals": ["Apprendre le café ☕"], "log": []}
+        
+        save_memory(test_memory)
+        
+        memory_file = os.path.join(self.test_dir, 'test_memory.json')
+        with open(memory_file, 'r', encoding='utf-8') as f:
+            self.assertIn("café ☕", f.read())
+        self.assertEqual(load_memory(), test_memory)
+    
     def test_save_memory_log_trimming(self):
         """Test that memory log gets trimmed when too large"""
         # Create memory with more than MAX_LOG_ENTRIES
@@ -106,6 +119,8 @@ class TestMemoryOperations(unittest.TestCase):
         
         with patch('main.MAX_LOG_ENTRIES', 100):
             save_memory(test_memory)
+        self.assertIs(test_memory["log"], large_log)
+        self.assertEqual(len(large_log), 100)
         
         memory_file = os.path.join(self.test_dir, 'test_memory.json')
         with open(memory_file, 'r') as f:
@@ -115,6 +130,49 @@ class TestMemoryOperations(unittest.TestCase):
         # Should keep the last 100 entries
         self.assertEqual(saved_data["log"][0]["user"], "msg50")
     
+    def test_save_memory_journals_new_entry(self):
+        """Test that a new log entry is appended to the journal, not the memory file"""
+        memory = load_memory()
+        save_memory(memory)
+        memory_file = os.path.join(self.test_dir, 'test_memory.json')
+        mtime = os.stat(memory_file).st_mtime_ns
+        
+        entry = {"timestamp": "2023-01-01", "user": "hi", "model": "hello"}
+        memory["log"].append(entry)
+        save_memory(memory, entry)
+        
+        self.assertEqual(os.stat(memory_file).st_mtime_ns, mtime)
+        with open(os.path.join(self.test_dir, 'test_memory.jsonl'), 'ab') as f:
+            f.write(b'{"timestamp": "torn')
+        self.assertEqual(load_memory()["log"], [entry])
+    
+    def test_save_memory_compacts_full_journal(self):
+        """Test that the journal is folded into the memory file once it is full"""
+        memory = load_memory()
+        with patch('main.MAX_LOG_ENTRIES', 3):
+            for i in range(4):
+                entry = {"timestamp": str(i), "user": f"msg{i}", "model": f"resp{i}"}
+                memory["log"].append(entry)
+                save_memory(memory, entry)
+        
+        journal_file = os.path.join(self.test_dir, 'test_memory.jsonl')
+        self.assertFalse(os.path.exists(journal_file))
+        memory_file = os.path.join(self.test_dir, 'test_memory.json')
+        with open(memory_file, 'r') as f:
+            saved_data = json.load(f)
+        self.assertEqual([e["user"] for e in saved_data["log"]], ["msg1", "msg2", "msg3"])
+        self.assertEqual(load_memory(), saved_data)
+    
+    def test_save_memory_interrupted_keeps_old_file(self):
+        """Test that a failed write leaves the previous memory file intact"""
+        save_memory({"goals": ["Old goal"], "log": []})
+        
+        with patch('main.os.fsync', side_effect=OSError("Disk full")):
+            with self.assertRaises(MemoryError):
+                save_memory({"goals": ["New goal"], "log": []})
+        
+        self.assertEqual(load_memory()["goals"], ["Old goal"])
+    
     @patch('builtins.open', side_effect=IOError("Permission denied"))
     def test_save_memory_io_error(self, mock_file):
         """Test save memory with IO error"""
@@ -127,26 +185,81 @@ class TestMemoryOperations(unittest.TestCase):
 class TestOllamaOperations(unittest.TestCase):
     """Test Ollama API operations"""
     
-    @patch('main.requests.post')
-    def test_query_ollama_success(self, mock_post):
+    @patch('main.get_ollama_session')
+    def test_query_ollama_success(self, mock_session):
         """Test successful Ollama query"""
         mock_response = MagicMock()
         mock_response.json.return_value = {"response": "Hello, how can I help?"}
         mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
+        mock_session.return_value.post.return_value = mock_response
         
         result = query_ollama("Hello")
         
         self.assertEqual(result, "Hello, how can I help?")
-        mock_post.assert_called_once_with(
+        mock_session.return_value.post.assert_called_once_with(
             OLLAMA_URL,
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": "Hello",
-                "stream": False
-            },
+            data=ANY,
+            headers={"Content-Type": "application/json"},
             timeout=REQUEST_TIMEOUT
         )
+        body = mock_session.return_value.post.call_args.kwargs["data"]
+        self.assertEqual(json.loads(body), {
+            "model": OLLAMA_MODEL,
+            "prompt": "Hello",
+            "stream": False
+        })
+    
+    @patch('main.get_ollama_session')
+    def test_query_ollama_stream(self, mock_session):
+        """Test streaming Ollama query yields chunks until done"""
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = iter([
+            b'{"response": "Hel", "done": false}',
+            b'',
+            b'{"response": "lo", "done": true}',
+            b'{"response": "ignored"}'
+        ])
+        mock_session.return_value.post.return_value = mock_response
+        
+        self.assertEqual(list(query_ollama_stream("Hello")), ["Hel", "lo"])
+        self.assertTrue(mock_session.return_value.post.call_args.kwargs["stream"])
+        body = json.loads(mock_session.return_value.post.call_args.kwargs["data"])
+        self.assertTrue(body["stream"])
+    
+    @patch('main.get_ollama_session')
+    def test_query_ollama_stream_error_chunk(self, mock_session):
+        """Test streaming Ollama query with an error reported mid-stream"""
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = iter([b'{"error": "model not found"}'])
+        mock_session.return_value.post.return_value = mock_response
+        
+        with self.assertRaises(OllamaConnectionError):
+            list(query_ollama_stream("Hello"))
+    
+    @patch('main.get_ollama_session')
+    def test_query_ollama_stream_incomplete(self, mock_session):
+        """Test streaming Ollama query when the stream ends without a done chunk"""
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = iter([b'{"response": "Hel", "done": false}', b''])
+        mock_session.return_value.post.return_value = mock_response
+        
+        stream = query_ollama_stream("Hello")
+        self.assertEqual(next(stream), "Hel")
+        with self.assertRaisesRegex(OllamaConnectionError, "Incomplete response"):
+            next(stream)
+    
+    def test_generate_body_escapes_model_and_prompt(self):
+        """Test that the prebuilt request body stays valid JSON for any text"""
+        body = _generate_body('odd"model', 'Line one\n"quoted" café', stream=False)
+        
+        self.assertEqual(json.loads(body), {
+            "model": 'odd"model',
+            "prompt": 'Line one\n"quoted" café',
+            "stream": False
+        })
     
     def test_query_ollama_empty_prompt(self):
         """Test Ollama query with empty prompt"""
@@ -156,44 +269,44 @@ class TestOllamaOperations(unittest.TestCase):
         with self.assertRaises(ValueError):
             query_ollama("   ")
     
-    @patch('main.requests.post')
-    def test_query_ollama_connection_error(self, mock_post):
+    @patch('main.get_ollama_session')
+    def test_query_ollama_connection_error(self, mock_session):
         """Test Ollama query with connection error"""
-        mock_post.side_effect = requests.exceptions.ConnectionError("Connection failed")
+        mock_session.return_value.post.side_effect = requests.exceptions.ConnectionError("Connection failed")
         
         with self.assertRaises(OllamaConnectionError) as context:
             query_ollama("Hello")
         
         self.assertIn("Could not connect to Ollama server", str(context.exception))
     
-    @patch('main.requests.post')
-    def test_query_ollama_timeout(self, mock_post):
+    @patch('main.get_ollama_session')
+    def test_query_ollama_timeout(self, mock_session):
         """Test Ollama query with timeout"""
-        mock_post.side_effect = requests.exceptions.Timeout("Request timed out")
+        mock_session.return_value.post.side_effect = requests.exceptions.Timeout("Request timed out")
         
         with self.assertRaises(OllamaConnectionError) as context:
             query_ollama("Hello")
         
         self.assertIn("timed out", str(context.exception))
     
-    @patch('main.requests.post')
-    def test_query_ollama_invalid_response(self, mock_post):
+    @patch('main.get_ollama_session')
+    def test_query_ollama_invalid_response(self, mock_session):
         """Test Ollama query with invalid response format"""
         mock_response = MagicMock()
         mock_response.json.return_value = {"error": "No response field"}
         mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
+        mock_session.return_value.post.return_value = mock_response
         
         with self.assertRaises(OllamaConnectionError):
             query_ollama("Hello")
     
-    @patch('main.requests.post')
-    def test_query_ollama_json_decode_error(self, mock_post):
+    @patch('main.get_ollama_session')
+    def test_query_ollama_json_decode_error(self, mock_session):
         """Test Ollama query with JSON decode error"""
         mock_response = MagicMock()
         mock_response.json.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
         mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
+        mock_session.return_value.post.return_value = mock_response
         
         with self.assertRaises(OllamaConnectionError):
             query_ollama("Hello")
@@ -213,6 +326,21 @@ class TestPromptBuilding(unittest.TestCase):
         self.assertIn("Hello", prompt)
         self.assertIn("You are an autonomous language model", prompt)
     
+    def test_build_prompt_layout(self):
+        """Test the complete prompt text for a small memory"""
+        memory = {"goals": ["Learn Python"], "log": [{"timestamp": "2023-01-01", "user": "Hi"}]}
+        
+        prompt = build_prompt(memory, "Hello")
+        
+        self.assertEqual(prompt, (
+            "\nYou are an autonomous language model tasked with helping a human achieve their goals.\n\n"
+            "Current Goals:\n- Learn Python\n\n"
+            "Recent Interaction Log:\n2023-01-01: Hi\n\n"
+            "Human said: Hello\n\n"
+            "Based on the goals and history, provide a thoughtful response and optionally "
+            "add or update a goal or memory entry.\n"
+        ))
+    
     def test_build_prompt_empty_memory(self):
         """Test prompt building with empty memory"""
         memory = {"goals": [], "log": []}
@@ -279,6 +407,27 @@ class TestPromptBuilding(unittest.TestCase):
         self.assertIn("2023-01-10: message10", prompt)
         self.assertNotIn("2023-01-01: message1", prompt)
 
+    
+    def test_build_prompt_reuses_recent_log_lines(self):
+        """Test that log entries already in the last prompt are not reformatted"""
+        class Entry(dict):
+            reads = 0
+            
+            def get(self, *args):
+                self.reads += 1
+                return super().get(*args)
+        
+        entries = [Entry(timestamp=f"t{i}", user=f"u{i}") for i in range(6)]
+        memory = {"goals": [], "log": entries[:5]}
+        build_prompt(memory, "Hello")
+        
+        memory["log"].append(entries[5])
+        prompt = build_prompt(memory, "Hello")
+        
+        self.assertIn("t1: u1\nt2: u2\nt3: u3\nt4: u4\nt5: u5", prompt)
+        self.assertEqual(entries[1].reads, 2)
+        self.assertEqual(entries[5].reads, 2)
+
 
 class TestErrorClasses(unittest.TestCase):
     """Test custom error classes"""
@@ -305,6 +454,15 @@ class TestErrorClasses(unittest.TestCase):
 class TestMainFunction(unittest.TestCase):
     """Test main function and integration"""
     
+    def test_import_does_not_load_requests(self):
+        """Test that importing main leaves requests to the first Ollama call"""
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, main; print('requests' in sys.modules)"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+        )
+        
+        self.assertEqual(result.stdout.strip(), "False")
+    
     @patch('main.input', side_effect=['exit'])
     @patch('main.load_memory')
     @patch('builtins.print')
@@ -322,18 +480,23 @@ class TestMainFunction(unittest.TestCase):
     
     @patch('main.input', side_effect=['hello', 'exit'])
     @patch('main.load_memory')
-    @patch('main.query_ollama')
+    @patch('main.query_ollama_stream')
     @patch('main.save_memory')
     @patch('builtins.print')
     def test_main_single_interaction(self, mock_print, mock_save, mock_query, mock_load, mock_input):
         """Test main function with single interaction"""
         mock_load.return_value = {"goals": [], "log": []}
-        mock_query.return_value = "Hello there!"
+        mock_query.return_value = iter(["Hello", " there!"])
         
         main()
         
         mock_query.assert_called_once()
         mock_save.assert_called()
+        entry = mock_save.call_args[0][1]
+        self.assertEqual(entry["model"], "Hello there!")
+        self.assertRegex(entry["timestamp"], r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$")
+        print_calls = [call[0][0] for call in mock_print.call_args_list if call[0]]
+        self.assertIn(" there!", print_calls)
     
     @patch('main.input', side_effect=['', 'exit'])
     @patch('main.load_memory')
@@ -350,7 +513,7 @@ class TestMainFunction(unittest.TestCase):
     
     @patch('main.input', side_effect=['hello', 'exit'])
     @patch('main.load_memory')
-    @patch('main.query_ollama')
+    @patch('main.query_ollama_stream')
     @patch('builtins.print')
     def test_main_ollama_connection_error(self, mock_print, mock_query, mock_load, mock_input):
         """Test main function with Ollama connection error"""
@@ -364,6 +527,46 @@ class TestMainFunction(unittest.TestCase):
         self.assertTrue(any("Error:" in call for call in print_calls))
 
 
+    @patch('main.input', side_effect=['hello', 'exit'])
+    @patch('main.load_memory')
+    @patch('main.query_ollama_stream')
+    @patch('main.save_memory')
+    @patch('builtins.print')
+    def test_main_empty_response_not_saved(self, mock_print, mock_save, mock_query, mock_load, mock_input):
+        """Test that an empty reply is reported and not added to the log"""
+        memory = {"goals": [], "log": []}
+        mock_load.return_value = memory
+        mock_query.return_value = iter([""])
+        
+        main()
+        
+        mock_save.assert_not_called()
+        self.assertEqual(memory["log"], [])
+        print_calls = [call[0][0] for call in mock_print.call_args_list if call[0]]
+        self.assertIn("No response received from Ollama.", print_calls)
+    
+    @patch('main.input', side_effect=['hello', 'exit'])
+    @patch('main.load_memory')
+    @patch('main.get_ollama_session')
+    @patch('main.save_memory')
+    @patch('builtins.print')
+    def test_main_incomplete_stream_not_saved(self, mock_print, mock_save, mock_session, mock_load, mock_input):
+        """Test that a reply cut off before done is reported as an error and not saved"""
+        memory = {"goals": [], "log": []}
+        mock_load.return_value = memory
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = iter([b'{"response": "Partial", "done": false}'])
+        mock_session.return_value.post.return_value = mock_response
+        
+        main()
+        
+        mock_save.assert_not_called()
+        self.assertEqual(memory["log"], [])
+        print_calls = [call[0][0] for call in mock_print.call_args_list if call[0]]
+        self.assertTrue(any("Incomplete response" in call for call in print_calls))
+
+
 class TestIntegration(unittest.TestCase):
     """Integration tests for the complete workflow"""
     
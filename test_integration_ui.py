@@ -1,20 +1,55 @@
 import unittest
-import time
 import tempfile
 import shutil
 import os
 from unittest.mock import patch, MagicMock
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException
 import threading
-from app import app
+from werkzeug.serving import make_server
+from app import app, flush_tree_memory
+from testutils import index_html, missing_substrings
 
+try:
+    from selenium import webdriver
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import TimeoutException
+    SELENIUM_AVAILABLE = True
+except ImportError:
+    SELENIUM_AVAILABLE = False
 
+# Decide once whether a browser test can run at all, so machines without
+# Chrome skip the class instead of starting a server and failing a launch
+CHROME_BINARIES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+CHROME_AVAILABLE = SELENIUM_AVAILABLE and any(shutil.which(name) for name in CHROME_BINARIES)
+
+
+LAYOUT_METRICS_JS = """
+    return {
+        sidebar: document.querySelector('.sidebar').getBoundingClientRect().height,
+        messages: document.getElementById('messages').getBoundingClientRect().height,
+        viewport: window.innerHeight,
+        bodyScroll: document.body.scrollHeight,
+        messageCount: document.getElementById('messages').children.length,
+        footerBottom: getComputedStyle(document.querySelector('.sidebar-footer')).bottom
+    };
+"""
+
+COMPUTED_STYLE_JS = """
+    const style = selector => window.getComputedStyle(document.querySelector(selector));
+    return {
+        bodyOverflow: style('body').overflow,
+        containerOverflow: style('.container').overflow,
+        containerHeight: style('.container').height,
+        messagesHeight: style('#messages').height,
+        footerPosition: style('.sidebar-footer').position,
+        viewport: window.innerHeight + 'px'
+    };
+"""
+
+
+@unittest.skipUnless(CHROME_AVAILABLE, "Selenium or Chrome not available")
 class TestSidebarGrowthBehavior(unittest.TestCase):
     """Integration test to identify and prevent sidebar growth issues"""
     
@@ -27,6 +62,22 @@ class TestSidebarGrowthBehavior(unittest.TestCase):
         cls.chrome_options.add_argument("--no-sandbox")
         cls.chrome_options.add_argument("--disable-dev-shm-usage")
         cls.chrome_options.add_argument("--window-size=1280,720")
+        # The page is static HTML + inline JS; skip everything else Chrome does
+        for flag in ("--disable-gpu",
+                     "--disable-extensions",
+                     "--disable-background-networking",
+                     "--disable-background-timer-throttling",
+                     "--disable-renderer-backgrounding",
+                     "--disable-features=TranslateUI",
+                     "--blink-settings=imagesEnabled=false",
+                     "--disable-default-apps",
+                     "--mute-audio"):
+            cls.chrome_options.add_argument(flag)
+        cls.chrome_options.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2})
+        # Use chromedriver from PATH directly; Selenium Manager only steps in
+        # (and may download a driver) when none is installed
+        cls.service = Service(executable_path=shutil.which("chromedriver"))
         
         # Create temporary directory for test files
         cls.test_dir = tempfile.mkdtemp()
@@ -40,46 +91,54 @@ class TestSidebarGrowthBehavior(unittest.TestCase):
                                      os.path.join(cls.test_dir, 'test_tree_memory.json'))
         cls.tree_memory_patch.start()
         
-        # Start Flask app in separate thread
-        cls.server_thread = threading.Thread(
-            target=lambda: app.run(host='127.0.0.1', port=5555, debug=False, use_reloader=False)
-        )
-        cls.server_thread.daemon = True
+        # Bind to a free port up front (parallel workers can't collide) so the
+        # server is already listening by the time the browser connects
+        cls.httpd = make_server('127.0.0.1', 0, app, threaded=True)
+        cls.port = cls.httpd.server_port
+        cls.base_url = f"http://127.0.0.1:{cls.port}"
+        cls.server_thread = threading.Thread(target=cls.httpd.serve_forever, daemon=True)
         cls.server_thread.start()
-        time.sleep(2)  # Wait for server to start
+        
+        # One browser for the whole class; starting Chrome is the slowest part
+        cls.driver = None
+        try:
+            cls.driver = webdriver.Chrome(service=cls.service, options=cls.chrome_options)
+        except Exception as e:
+            cls.driver_error = e
     
     @classmethod 
     def tearDownClass(cls):
         """Clean up test environment"""
+        if cls.driver is not None:
+            cls.driver.quit()
+        cls.httpd.shutdown()
+        cls.server_thread.join()
+        flush_tree_memory()
         cls.tree_memory_patch.stop()
         shutil.rmtree(cls.test_dir)
     
     def setUp(self):
-        """Set up for each test"""
-        try:
-            self.driver = webdriver.Chrome(options=self.chrome_options)
-            self.driver.get("http://127.0.0.1:5555")
-            self.wait = WebDriverWait(self.driver, 10)
-        except Exception as e:
-            self.skipTest(f"Chrome WebDriver not available: {e}")
+        """Load a fresh page in the shared browser for each test"""
+        if self.driver is None:
+            self.skipTest(f"Chrome WebDriver not available: {self.driver_error}")
+        self.driver.get(self.base_url)
+        self.wait = WebDriverWait(self.driver, 10)
+        self.install_send_stub()
     
     def tearDown(self):
-        """Clean up after each test"""
-        if hasattr(self, 'driver'):
-            self.driver.quit()
+        """Forget saved sidebar sizes and settings before the next test loads"""
+        self.driver.execute_script("window.localStorage.clear();")
     
-    def get_sidebar_height(self):
-        """Get current sidebar height"""
-        sidebar = self.driver.find_element(By.CLASS_NAME, "sidebar")
-        return sidebar.size['height']
+    def get_layout_metrics(self):
+        """Get sidebar, messages container and page heights in one round trip"""
+        return self.driver.execute_script(LAYOUT_METRICS_JS)
     
-    def get_messages_container_height(self):
-        """Get messages container height"""
-        messages = self.driver.find_element(By.ID, "messages")
-        return messages.size['height']
+    def get_computed_styles(self):
+        """Get the computed CSS values the layout relies on in one round trip"""
+        return self.driver.execute_script(COMPUTED_STYLE_JS)
     
-    def send_test_message(self, message="Test message"):
-        """Send a test message"""
+    def install_send_stub(self):
+        """Replace sendMessage with a synchronous stub that skips the API"""
         # Mock the Ollama response to avoid external dependencies
         self.driver.execute_script("""
             // Override the sendMessage function to avoid actual API calls
@@ -108,156 +167,75 @@ class TestSidebarGrowthBehavior(unittest.TestCase):
                 `;
             };
         """)
-        
-        input_field = self.driver.find_element(By.ID, "messageInput")
-        input_field.clear()
-        input_field.send_keys(message)
-        input_field.send_keys(Keys.RETURN)
-        time.sleep(0.5)  # Allow UI to update
     
-    def test_sidebar_height_remains_constant(self):
-        """Test that sidebar height doesn't grow beyond viewport"""
-        initial_height = self.get_sidebar_height()
-        viewport_height = self.driver.execute_script("return window.innerHeight;")
+    def send_test_message(self, message="Test message"):
+        """Send a test message"""
+        # Fill the input and call the stub in one round trip; it runs
+        # synchronously, so the UI has updated by the time this returns
+        self.driver.execute_script(
+            "document.getElementById('messageInput').value = arguments[0]; sendMessage();",
+            message)
+    
+    def test_invariants_under_message_load(self):
+        """Test that the layout holds steady while many messages are sent"""
+        initial = self.get_layout_metrics()
+        viewport_height = initial['viewport']
         
-        # Initial height should not exceed viewport
-        self.assertLessEqual(initial_height, viewport_height, 
+        # Initial state: sidebar fits, no body scrollbar, footer at the bottom
+        self.assertLessEqual(initial['sidebar'], viewport_height,
                            "Initial sidebar height exceeds viewport height")
+        self.assertLessEqual(initial['bodyScroll'], viewport_height + 5,  # 5px tolerance
+                           "Page initially has vertical scrollbar")
+        self.assertEqual(self.get_computed_styles()['footerPosition'], "absolute", "Footer should be absolutely positioned")
+        self.assertEqual(initial['footerBottom'], "0px", "Footer should be at bottom")
         
-        # Send multiple messages
-        for i in range(10):
-            self.send_test_message(f"Test message {i+1}")
-            
-            current_height = self.get_sidebar_height()
-            self.assertLessEqual(current_height, viewport_height + 10,
-                               msg=f"Sidebar height ({current_height}px) exceeds viewport ({viewport_height}px) after {i+1} messages")
+        # One send loop, checking every invariant after each message
+        for i in range(20):
+            self.send_test_message(f"Layout load message {i+1}")
+            current = self.get_layout_metrics()
             
-            # Height should remain essentially constant
-            self.assertAlmostEqual(current_height, initial_height, delta=50,
+            self.assertLessEqual(current['sidebar'], viewport_height + 10,
+                               msg=f"Sidebar height ({current['sidebar']}px) exceeds viewport ({viewport_height}px) after {i+1} messages")
+            self.assertAlmostEqual(current['sidebar'], initial['sidebar'], delta=50,
                                  msg=f"Sidebar height changed significantly after {i+1} messages")
-    
-    def test_messages_container_height_fixed(self):
-        """Test that messages container height stays fixed"""
-        initial_height = self.get_messages_container_height()
-        
-        # Send multiple messages to trigger potential growth
-        for i in range(15):
-            self.send_test_message(f"Message that could cause growth {i+1}")
-            
-            current_height = self.get_messages_container_height()
-            self.assertEqual(current_height, initial_height,
+            self.assertEqual(current['messages'], initial['messages'],
                            f"Messages container height changed after {i+1} messages")
-    
-    def test_no_vertical_scrollbar_on_body(self):
-        """Test that body doesn't develop a vertical scrollbar"""
-        # Initial state
-        body_scroll_height = self.driver.execute_script("return document.body.scrollHeight;")
-        viewport_height = self.driver.execute_script("return window.innerHeight;")
-        
-        # Should not have vertical scroll initially
-        self.assertLessEqual(body_scroll_height, viewport_height + 5,  # 5px tolerance
-                           "Page initially has vertical scrollbar")
-        
-        # After multiple messages
-        for i in range(20):
-            self.send_test_message(f"Potential scroll trigger {i+1}")
-        
-        final_scroll_height = self.driver.execute_script("return document.body.scrollHeight;")
-        self.assertLessEqual(final_scroll_height, viewport_height + 5,
-                           "Page developed vertical scrollbar after messages")
+            self.assertLessEqual(current['bodyScroll'], viewport_height + 5,
+                               f"Page developed vertical scrollbar after {i+1} messages")
+            self.assertEqual(current['footerBottom'], "0px",
+                           f"Footer moved from bottom after {i+1} messages")
+            self.assertLessEqual(current['messageCount'], 10,
+                               f"More than 10 messages displayed after {i+1} messages")
     
     def test_container_overflow_handling(self):
         """Test that container properly handles overflow"""
         # Check that container has proper overflow settings
-        container = self.driver.find_element(By.CLASS_NAME, "container")
-        container_overflow = self.driver.execute_script(
-            "return window.getComputedStyle(arguments[0]).overflow;", container)
+        container_overflow = self.get_computed_styles()['containerOverflow']
         
         # Container should not allow overflow that creates scrollbars
         self.assertNotEqual(container_overflow, "visible", 
                           "Container allows visible overflow")
     
-    def test_sidebar_footer_positioning(self):
-        """Test that sidebar footer stays at bottom without affecting layout"""
-        sidebar_footer = self.driver.find_element(By.CLASS_NAME, "sidebar-footer")
-        
-        # Get positioning properties
-        position = self.driver.execute_script(
-            "return window.getComputedStyle(arguments[0]).position;", sidebar_footer)
-        bottom = self.driver.execute_script(
-            "return window.getComputedStyle(arguments[0]).bottom;", sidebar_footer)
-        
-        self.assertEqual(position, "absolute", "Footer should be absolutely positioned")
-        self.assertEqual(bottom, "0px", "Footer should be at bottom")
-        
-        # Send messages and ensure footer position doesn't change
-        for i in range(5):
-            self.send_test_message(f"Footer position test {i+1}")
-            
-            new_bottom = self.driver.execute_script(
-                "return window.getComputedStyle(arguments[0]).bottom;", sidebar_footer)
-            self.assertEqual(new_bottom, "0px", 
-                           f"Footer moved from bottom after {i+1} messages")
-    
-    def test_message_limiting_works(self):
-        """Test that message limiting prevents accumulation"""
-        # Send more than 10 messages (the limit)
-        for i in range(15):
-            self.send_test_message(f"Message limit test {i+1}")
-        
-        # Check that only 10 or fewer messages are displayed
-        messages_count = self.driver.execute_script(
-            "return document.getElementById('messages').children.length;")
-        
-        self.assertLessEqual(messages_count, 10, 
-                           "More than 10 messages are displayed")
-    
-    def test_rapid_message_sending(self):
-        """Test rapid message sending doesn't break layout"""
-        initial_height = self.get_sidebar_height()
-        
-        # Rapidly send messages
-        for i in range(20):
-            self.send_test_message(f"Rapid message {i+1}")
-            if i % 5 == 0:  # Check every 5 messages
-                current_height = self.get_sidebar_height()
-                self.assertAlmostEqual(current_height, initial_height, delta=50,
-                                      msg=f"Layout broken during rapid sending at message {i+1}")
-    
     def test_css_layout_constraints_applied(self):
         """Test that critical CSS constraints are actually applied"""
+        styles = self.get_computed_styles()
+        
         # Check body overflow
-        body_overflow = self.driver.execute_script(
-            "return window.getComputedStyle(document.body).overflow;")
-        self.assertEqual(body_overflow, "hidden", "Body should have overflow: hidden")
+        self.assertEqual(styles['bodyOverflow'], "hidden", "Body should have overflow: hidden")
         
         # Check container height
-        container = self.driver.find_element(By.CLASS_NAME, "container")
-        container_height = self.driver.execute_script(
-            "return window.getComputedStyle(arguments[0]).height;", container)
-        viewport_height = self.driver.execute_script("return window.innerHeight + 'px';")
-        self.assertEqual(container_height, viewport_height, "Container should be 100vh")
+        self.assertEqual(styles['containerHeight'], styles['viewport'], "Container should be 100vh")
         
         # Check messages height
-        messages = self.driver.find_element(By.ID, "messages")
-        messages_height = self.driver.execute_script(
-            "return window.getComputedStyle(arguments[0]).height;", messages)
-        self.assertEqual(messages_height, "140px", "Messages should be fixed at 140px")
+        self.assertEqual(styles['messagesHeight'], "140px", "Messages should be fixed at 140px")
 
 
 class TestLayoutStress(unittest.TestCase):
     """Stress test to identify layout breaking points"""
     
-    def setUp(self):
-        """Set up test client"""
-        self.app = app
-        self.app.config['TESTING'] = True
-        self.client = self.app.test_client()
-    
     def test_large_node_content_handling(self):
         """Test how layout handles very large content"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         # Check that CSS includes word-wrap and overflow handling
         self.assertIn('word-wrap: break-word', html_content)
@@ -265,8 +243,7 @@ class TestLayoutStress(unittest.TestCase):
     
     def test_css_rule_completeness(self):
         """Test that all critical CSS rules are present"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         critical_rules = [
             'height: 100vh',
@@ -279,10 +256,7 @@ class TestLayoutStress(unittest.TestCase):
             'box-sizing: border-box'
         ]
         
-        missing_rules = []
-        for rule in critical_rules:
-            if rule not in html_content:
-                missing_rules.append(rule)
+        missing_rules = missing_substrings(html_content, critical_rules)
         
         self.assertEqual(len(missing_rules), 0, 
                         f"Missing critical CSS rules: {missing_rules}")
@@ -1,33 +1,59 @@
 import unittest
 import json
+import re
 import os
 import tempfile
 import shutil
+import threading
+import time
+import logging
+from logging.handlers import QueueHandler
 from unittest.mock import patch, MagicMock
 import requests
 from flask import Flask
-from app import app, load_tree_memory, save_tree_memory, build_conversation_context
+import app as app_module
+from app import (
+    app, load_tree_memory, save_tree_memory, flush_tree_memory,
+    build_conversation_context, check_ollama_connection, get_available_models,
+    evict_oldest_leaves, log_listener, memory_manager, create_ghost_branch,
+    remove_subtree, get_available_model_names, record_edit,
+)
+from testutils import index_html, missing_substrings
+
+
+# Flex growth on #messages (however the rule is formatted) or anywhere else
+PROBLEMATIC_FLEX_RE = re.compile(r"#messages\s*\{[^}]*\bflex\s*:\s*1\b|flex-grow\s*:\s*1")
 
 
 class TestFlaskApp(unittest.TestCase):
     """Test Flask web application"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Create the test client and one scratch directory for the whole class"""
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.client = cls.app.test_client()
+        cls.class_dir = tempfile.mkdtemp()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the scratch directory and everything the tests left in it"""
+        shutil.rmtree(cls.class_dir)
+    
     def setUp(self):
         """Set up test environment"""
-        self.app = app
-        self.app.config['TESTING'] = True
-        self.client = self.app.test_client()
-        
-        # Create temporary directory for test files
-        self.test_dir = tempfile.mkdtemp()
+        # Give each test its own subdirectory; removed in tearDownClass
+        self.test_dir = os.path.join(self.class_dir, self._testMethodName)
+        os.mkdir(self.test_dir)
         self.tree_memory_patch = patch('app.TREE_MEMORY_FILE', 
                                       os.path.join(self.test_dir, 'test_tree_memory.json'))
         self.tree_memory_patch.start()
     
     def tearDown(self):
         """Clean up test environment"""
+        flush_tree_memory()
         self.tree_memory_patch.stop()
-        shutil.rmtree(self.test_dir)
     
     def test_index_route(self):
         """Test main index route returns HTML"""
@@ -38,8 +64,7 @@ class TestFlaskApp(unittest.TestCase):
     
     def test_index_contains_layout_constraints(self):
         """Test that index.html contains proper layout constraints to prevent growing"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         # Check for critical CSS that prevents growing
         self.assertIn('height: 100vh', html_content)
@@ -62,6 +87,26 @@ class TestFlaskApp(unittest.TestCase):
         expected = {"nodes": {}, "root_id": None}
         self.assertEqual(data, expected)
     
+    @patch('app.query_ollama')
+    def test_get_tree_conditional(self, mock_query):
+        """Test that unchanged trees are answered with 304 Not Modified"""
+        mock_query.return_value = "Hi"
+        
+        first = self.client.get('/api/tree')
+        etag = first.headers['ETag']
+        
+        with patch('app.orjson.dumps') as mock_dumps:
+            cached = self.client.get('/api/tree', headers={'If-None-Match': etag})
+        mock_dumps.assert_not_called()
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b'')
+        
+        self.client.post('/api/chat', json={'message': 'Hello'})
+        changed = self.client.get('/api/tree', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+        self.assertEqual(len(json.loads(changed.data)["nodes"]), 1)
+    
     def test_reset_tree(self):
         """Test resetting conversation tree"""
         response = self.client.post('/api/tree/reset')
@@ -85,6 +130,7 @@ class TestFlaskApp(unittest.TestCase):
         self.assertIn('response', data)
         self.assertIn('timestamp', data)
         self.assertEqual(data['response'], "Hello! How can I help you today?")
+        self.assertRegex(data['node_id'], r'^[0-9a-f]{32}$')
     
     @patch('app.query_ollama')
     def test_chat_with_parent(self, mock_query):
@@ -106,6 +152,21 @@ class TestFlaskApp(unittest.TestCase):
         data = json.loads(response.data)
         self.assertEqual(data['response'], "That's interesting!")
     
+    @patch('app.query_ollama')
+    def test_chained_chat_reuses_loaded_tree(self, mock_query):
+        """Test that follow-up chat turns never re-read or re-parse the tree file"""
+        mock_query.return_value = "Go on"
+        parent_id = json.loads(self.client.post('/api/chat', json={'message': 'Hello'}).data)['node_id']
+    
+        with patch('app._read_tree_file') as mock_read:
+            for turn in range(3):
+                response = self.client.post('/api/chat', json={'message': f'Turn {turn}',
+                                                               'parent_id': parent_id})
+                parent_id = json.loads(response.data)['node_id']
+    
+        mock_read.assert_not_called()
+        self.assertEqual(len(load_tree_memory()['nodes']), 4)
+    
     def test_chat_empty_message(self):
         """Test chat with empty message"""
         response = self.client.post('/api/chat', 
@@ -128,10 +189,65 @@ class TestFlaskApp(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn('error', data)
     
+    def test_health_response_is_compact_json(self):
+        """Test that JSON responses are compact orjson output"""
+        response = self.client.get('/api/health')
+        
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertTrue(response.data.startswith(b'{"status":"healthy",'))
+        self.assertEqual(json.loads(response.data)["version"], "1.0.0")
+    
+    def test_logging_goes_through_queue(self):
+        """Test that request logging only enqueues records for the listener"""
+        queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, QueueHandler)]
+        
+        self.assertEqual(len(queue_handlers), 1)
+        self.assertIs(queue_handlers[0].queue, log_listener.queue)
+        self.assertTrue(any(
+            isinstance(h, logging.FileHandler) and h.baseFilename.endswith('alm_web.log')
+            for h in log_listener.handlers
+        ))
+        self.assertTrue(all(
+            h.maxBytes > 0 for h in log_listener.handlers if isinstance(h, logging.FileHandler)
+        ))
+    
+    def test_log_arguments_are_formatted_lazily(self):
+        """Test that log calls pass their values as arguments, not pre-built strings"""
+        tree_data = load_tree_memory()
+        tree_data["ghost_branches"] = {"ghost_1": {}}
+        with self.assertLogs('app', level='INFO') as logs:
+            app_module._delete_ghost(tree_data, "ghost_1")
+        flush_tree_memory()
+        
+        self.assertEqual(logs.records[0].msg, "Ghost branch %s deleted permanently")
+        self.assertEqual(logs.records[0].args, ("ghost_1",))
+    
+    @patch('app.check_ollama_connection')
+    def test_status_response_is_compact_in_debug_mode(self, mock_check):
+        """Test that debug mode does not pretty-print JSON responses"""
+        mock_check.return_value = False
+        
+        with patch.dict(app.config, {'DEBUG': True}):
+            response = self.client.get('/api/status')
+        
+        self.assertNotIn(b'\n', response.data)
+        self.assertNotIn(b'": ', response.data)
+    
     def test_get_nonexistent_node(self):
         """Test getting details of non-existent node"""
         response = self.client.get('/api/node/nonexistent')
         self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(json.loads(response.data), {"error": "Node not found"})
+    
+    def test_error_bodies_are_encoded_once(self):
+        """Test that repeated errors reuse the encoded body of their message"""
+        self.client.get('/api/no-such-endpoint')
+        with patch('app.orjson.dumps') as mock_dumps:
+            response = self.client.get('/api/no-such-endpoint')
+        mock_dumps.assert_not_called()
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.data), {"error": "Endpoint not found"})
 
     @patch('app.tokenize_prompt')
     def test_tokenize_endpoint(self, mock_tokenize):
@@ -150,17 +266,29 @@ class TestFlaskApp(unittest.TestCase):
 class TestTreeMemoryOperations(unittest.TestCase):
     """Test tree memory operations"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Create one scratch directory shared by every test in the class"""
+        cls.class_dir = tempfile.mkdtemp()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the scratch directory and everything the tests left in it"""
+        shutil.rmtree(cls.class_dir)
+    
     def setUp(self):
         """Set up test environment"""
-        self.test_dir = tempfile.mkdtemp()
+        # Give each test its own subdirectory; removed in tearDownClass
+        self.test_dir = os.path.join(self.class_dir, self._testMethodName)
+        os.mkdir(self.test_dir)
         self.tree_memory_patch = patch('app.TREE_MEMORY_FILE', 
                                       os.path.join(self.test_dir, 'test_tree_memory.json'))
         self.tree_memory_patch.start()
     
     def tearDown(self):
         """Clean up test environment"""
+        flush_tree_memory()
         self.tree_memory_patch.stop()
-        shutil.rmtree(self.test_dir)
     
     def test_load_tree_memory_new_file(self):
         """Test loading tree memory when file doesn't exist"""
@@ -190,6 +318,46 @@ class TestTreeMemoryOperations(unittest.TestCase):
         tree_data = load_tree_memory()
         self.assertEqual(tree_data, test_tree)
     
+    def test_load_tree_memory_shares_node_id_strings(self):
+        """Test that loaded id references all point at the node's key string"""
+        tree_file = os.path.join(self.test_dir, 'test_tree_memory.json')
+        with open(tree_file, 'w') as f:
+            json.dump({"nodes": {
+                "node1": {"id": "node1", "parent_id": None, "children": ["node2"], "model_used": "m"},
+                "node2": {"id": "node2", "parent_id": "node1", "children": [], "model_used": "m"},
+            }, "root_id": "node1"}, f)
+        
+        nodes = load_tree_memory()["nodes"]
+        keys = {key: key for key in nodes}
+        
+        self.assertIs(nodes["node2"]["parent_id"], keys["node1"])
+        self.assertIs(nodes["node1"]["children"][0], keys["node2"])
+        self.assertIs(nodes["node2"]["id"], keys["node2"])
+        self.assertIs(nodes["node1"]["model_used"], nodes["node2"]["model_used"])
+    
+    def test_load_tree_memory_shares_ghost_node_id_strings(self):
+        """Test that ghost branch ids point at the same strings as the tree's"""
+        root_id, child_id = "a" * 32, "b" * 32
+        tree_file = os.path.join(self.test_dir, 'test_tree_memory.json')
+        with open(tree_file, 'w') as f:
+            json.dump({"nodes": {root_id: {"id": root_id, "parent_id": None, "children": []}},
+                       "root_id": root_id,
+                       "ghost_branches": {"ghost_1": {
+                           "id": "ghost_1", "original_node_id": root_id, "root_id": root_id,
+                           "nodes": {
+                               root_id: {"id": root_id, "parent_id": None, "children": [child_id]},
+                               child_id: {"id": child_id, "parent_id": root_id, "children": []}
+                           }}}}, f)
+        
+        tree_data = load_tree_memory()
+        key = next(iter(tree_data["nodes"]))
+        ghost = tree_data["ghost_branches"]["ghost_1"]
+        
+        self.assertIs(ghost["original_node_id"], key)
+        self.assertIs(next(iter(ghost["nodes"])), key)
+        self.assertIs(ghost["nodes"][child_id]["parent_id"], key)
+        self.assertIs(ghost["nodes"][key]["children"][0], list(ghost["nodes"])[1])
+    
     def test_save_tree_memory(self):
         """Test saving tree memory"""
         test_tree = {
@@ -198,6 +366,7 @@ class TestTreeMemoryOperations(unittest.TestCase):
         }
         
         save_tree_memory(test_tree)
+        flush_tree_memory()
         
         tree_file = os.path.join(self.test_dir, 'test_tree_memory.json')
         self.assertTrue(os.path.exists(tree_file))
@@ -206,6 +375,406 @@ class TestTreeMemoryOperations(unittest.TestCase):
             saved_data = json.load(f)
         
         self.assertEqual(saved_data, test_tree)
+
+    def test_save_tree_memory_writes_compact_json(self):
+        """Test that the tree file carries no indentation or separator padding"""
+        save_tree_memory({"nodes": {"node1": {"id": "node1", "children": []}}, "root_id": "node1"})
+        flush_tree_memory()
+        
+        with open(os.path.join(self.test_dir, 'test_tree_memory.json'), 'rb') as f:
+            self.assertEqual(f.read(), b'{"nodes":{"node1":{"id":"node1","children":[]}},"root_id":"node1"}')
+
+    def test_save_tree_memory_coalesces_writes(self):
+        """Test that a burst of saves is written to disk once, with the latest tree"""
+        with patch('app._write_file_atomic') as mock_write:
+            for i in range(3):
+                save_tree_memory({"nodes": {}, "root_id": f"node{i}"})
+            flush_tree_memory()
+        
+        mock_write.assert_called_once()
+        self.assertEqual(json.loads(mock_write.call_args[0][1])["root_id"], "node2")
+
+    def test_tree_writer_waits_for_burst_to_settle(self):
+        """Test that saves arriving faster than the delay keep postponing the write"""
+        writer = app_module.TreeWriter(delay=0.2, max_delay=5)
+        path = os.path.join(self.test_dir, 'burst.json')
+        with patch('app._write_file_atomic') as mock_write:
+            for i in range(6):
+                writer.schedule(path, {"nodes": {}, "root_id": f"node{i}"})
+                time.sleep(0.05)
+            writer.flush()
+        
+        mock_write.assert_called_once()
+        self.assertEqual(json.loads(mock_write.call_args[0][1])["root_id"], "node5")
+    
+    def test_tree_writer_survives_failed_batch(self):
+        """Test that an unexpected error in a batch neither kills the writer nor hangs flush"""
+        writer = app_module.TreeWriter(delay=0.01)
+        path = os.path.join(self.test_dir, 'failing.json')
+        with patch.object(writer, '_write_batch', side_effect=[RuntimeError("boom"), None]) as mock_batch, \
+             self.assertLogs('app', level='ERROR') as logs:
+            writer.schedule(path, {"nodes": {}, "root_id": None})
+            flusher = threading.Thread(target=writer.flush, daemon=True)
+            flusher.start()
+            flusher.join(2)
+            self.assertFalse(flusher.is_alive(), "flush() hung after a failed batch")
+            
+            writer.schedule(path, {"nodes": {}, "root_id": None})
+            writer.flush()
+        
+        self.assertEqual(mock_batch.call_count, 2)
+        self.assertIn("Tree writer failed", logs.output[0])
+    
+    def test_load_tree_memory_served_from_cache(self):
+        """Test that the tree is only read from disk once and saves write through"""
+        tree_data = load_tree_memory()
+
+        with patch('app._read_tree_file') as mock_read:
+            self.assertIs(load_tree_memory(), tree_data)
+            mock_read.assert_not_called()
+
+        new_tree = {"nodes": {"node1": {"id": "node1"}}, "root_id": "node1"}
+        save_tree_memory(new_tree)
+        self.assertIs(load_tree_memory(), new_tree)
+
+    @patch('app.query_ollama')
+    def test_chat_turns_are_journaled(self, mock_query):
+        """Test that chat turns append to the journal instead of rewriting the tree"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        
+        first = json.loads(client.post('/api/chat', json={'message': 'First'}).data)
+        client.post('/api/chat', json={'message': 'Second', 'parent_id': first['node_id']})
+        flush_tree_memory()
+        
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'test_tree_memory.json')))
+        with open(os.path.join(self.test_dir, 'test_tree_memory.jsonl'), 'r') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r['user_input'] for r in records], ['First', 'Second'])
+        self.assertEqual(records[1]['parent_id'], first['node_id'])
+    
+    @patch('app.query_ollama')
+    def test_chat_does_not_wait_for_disk(self, mock_query):
+        """Test that chat responds while its save is still blocked on the disk"""
+        mock_query.return_value = "Reply"
+        release = threading.Event()
+        written = threading.Event()
+        
+        def slow_append(path, payload):
+            release.wait(5)
+            written.set()
+        
+        with patch('app._append_file', side_effect=slow_append):
+            response = app.test_client().post('/api/chat', json={'message': 'Hello'})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(written.is_set())
+            release.set()
+            flush_tree_memory()
+        self.assertTrue(written.is_set())
+    
+    @patch('app.query_ollama')
+    def test_full_journal_is_folded_into_tree_file(self, mock_query):
+        """Test that the journal is compacted once it reaches its record limit"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        
+        with patch('app.tree_writer.max_records', 2):
+            client.post('/api/chat', json={'message': 'First'})
+            flush_tree_memory()
+            client.post('/api/chat', json={'message': 'Second'})
+            flush_tree_memory()
+        
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'test_tree_memory.jsonl')))
+        with open(os.path.join(self.test_dir, 'test_tree_memory.json'), 'r') as f:
+            self.assertEqual(len(json.load(f)["nodes"]), 2)
+    
+    @patch('app.query_ollama')
+    def test_edits_are_journaled_and_replayed(self, mock_query):
+        """Test that an edit is journaled and rebuilds the same tree on reload"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        first = json.loads(client.post('/api/chat', json={'message': 'First'}).data)
+        client.post('/api/chat', json={'message': 'Second', 'parent_id': first['node_id']})
+        client.post(f"/api/node/{first['node_id']}/edit", json={'user_input': 'Edited'})
+        flush_tree_memory()
+        
+        with open(os.path.join(self.test_dir, 'test_tree_memory.jsonl'), 'r') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[-1]["op"], "edit")
+        
+        with patch('app._TREE_CACHE', None):
+            reloaded = load_tree_memory()
+            flush_tree_memory()
+        self.assertEqual(list(reloaded["nodes"]), [first['node_id']])
+        self.assertEqual(reloaded["nodes"][first['node_id']]["user_input"], "Edited")
+        self.assertEqual(reloaded["nodes"][first['node_id']]["children"], [])
+    
+    @patch('app.query_ollama')
+    def test_ghost_operations_are_journaled_and_replayed(self, mock_query):
+        """Test that ghosting edits, restores and deletes rebuild the same tree on reload"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        first = json.loads(client.post('/api/chat', json={'message': 'First'}).data)
+        client.post('/api/chat', json={'message': 'Second', 'parent_id': first['node_id']})
+        edit_url = f"/api/node/{first['node_id']}/edit"
+        ghost1 = json.loads(client.post(edit_url, json={
+            'user_input': 'Edited', 'create_ghost': True}).data)['ghost_branch_id']
+        client.post(f"/api/ghost-branches/{ghost1}/restore")
+        client.post(edit_url, json={'user_input': 'Again', 'create_ghost': True})
+        client.post(edit_url, json={'ai_response': 'Changed', 'create_ghost': True})
+        ghost2 = list(load_tree_memory()["ghost_branches"])[0]
+        client.delete(f"/api/ghost-branches/{ghost2}")
+        expected = json.loads(client.get('/api/tree').data)
+        flush_tree_memory()
+        
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'test_tree_memory.json')))
+        with open(os.path.join(self.test_dir, 'test_tree_memory.jsonl'), 'r') as f:
+            ops = [json.loads(line).get("op") for line in f]
+        self.assertEqual(ops, [None, None, "edit", "restore_ghost", "edit", "edit", "delete_ghost"])
+        
+        with patch('app._TREE_CACHE', None):
+            reloaded = load_tree_memory()
+            flush_tree_memory()
+        self.assertEqual(reloaded, expected)
+        self.assertEqual(reloaded["ghost_branches"], {})
+        self.assertEqual(reloaded["nodes"][first['node_id']]["ai_response"], "Changed")
+    
+    def test_ghost_delete_uses_cached_tree(self):
+        """Test that deleting a ghost neither re-reads nor rewrites the tree file"""
+        tree_data = load_tree_memory()
+        tree_data["ghost_branches"] = {"ghost_1": {"id": "ghost_1", "original_node_id": "node1", "nodes": {}}}
+        save_tree_memory(tree_data)
+        flush_tree_memory()
+        
+        with patch('app._read_tree_file') as mock_read, \
+                patch('app._write_file_atomic') as mock_write:
+            response = app.test_client().delete('/api/ghost-branches/ghost_1')
+            flush_tree_memory()
+        
+        self.assertEqual(response.status_code, 200)
+        mock_read.assert_not_called()
+        mock_write.assert_not_called()
+        self.assertEqual(load_tree_memory()["ghost_branches"], {})
+    
+    def test_load_tree_memory_replays_journal(self):
+        """Test that journaled nodes are linked into the tree and folded into the file"""
+        node1 = {"id": "node1", "user_input": "Hello", "ai_response": "Hi", "parent_id": None, "children": []}
+        node2 = {"id": "node2", "user_input": "More", "ai_response": "Sure", "parent_id": "node1", "children": []}
+        tree_file = os.path.join(self.test_dir, 'test_tree_memory.json')
+        journal_file = os.path.join(self.test_dir, 'test_tree_memory.jsonl')
+        with open(tree_file, 'w') as f:
+            json.dump({"nodes": {"node1": node1}, "root_id": "node1"}, f)
+        with open(journal_file, 'w') as f:
+            # node1 is already in the tree file; the last record is torn
+            f.write(json.dumps(node1) + "\n" + json.dumps(node2) + "\n" + '{"id": "node3", "us')
+        
+        tree_data = load_tree_memory()
+        
+        self.assertEqual(set(tree_data["nodes"]), {"node1", "node2"})
+        self.assertEqual(tree_data["nodes"]["node1"]["children"], ["node2"])
+        self.assertEqual(tree_data["root_id"], "node1")
+        
+        flush_tree_memory()
+        self.assertFalse(os.path.exists(journal_file))
+        with open(tree_file, 'r') as f:
+            self.assertEqual(json.load(f), tree_data)
+    
+    def test_memory_manager_shares_cached_tree(self):
+        """Test that the memory manager works on the same tree as the handlers"""
+        self.assertIs(memory_manager.tree, load_tree_memory())
+        
+        root_id = memory_manager.add_conversation(None, "Hello", "Hi", "test-model")
+        child_id = memory_manager.add_conversation(root_id, "More", "Sure", "test-model")
+        
+        tree_data = json.loads(app.test_client().get('/api/tree').data)
+        self.assertEqual(tree_data["root_id"], root_id)
+        self.assertEqual(tree_data["nodes"][root_id]["children"], [child_id])
+        self.assertEqual(build_conversation_context(load_tree_memory(), child_id),
+                         "Human: Hello\nAssistant: Hi\nHuman: More\nAssistant: Sure")
+    
+    def test_memory_manager_ghosts_visible_to_handlers(self):
+        """Test that manager edits create ghosts the ghost routes can restore"""
+        root_id = memory_manager.add_conversation(None, "Hello", "Hi", "test-model")
+        child_id = memory_manager.add_conversation(root_id, "More", "Sure", "test-model")
+        
+        result = memory_manager.edit_node(root_id, user_input="Edited", create_ghost=True)
+        ghost_id = result["ghost_branch_id"]
+        self.assertIn(ghost_id, memory_manager.ghost_branches)
+        
+        client = app.test_client()
+        self.assertIn(ghost_id, json.loads(client.get('/api/ghost-branches').data))
+        client.post(f"/api/ghost-branches/{ghost_id}/restore")
+        self.assertEqual(load_tree_memory()["nodes"][root_id]["children"], [child_id])
+        self.assertEqual(memory_manager.ghost_branches, {})
+    
+    def test_memory_manager_remove_subtree_is_saved(self):
+        """Test that removing a subtree through the manager survives a reload"""
+        root_id = memory_manager.add_conversation(None, "Hello", "Hi", "test-model")
+        memory_manager.add_conversation(root_id, "More", "Sure", "test-model")
+        
+        memory_manager.remove_subtree(root_id)
+        flush_tree_memory()
+        
+        with patch('app._TREE_CACHE', None):
+            reloaded = load_tree_memory()
+            flush_tree_memory()
+        self.assertEqual(list(reloaded["nodes"]), [root_id])
+        self.assertEqual(reloaded["nodes"][root_id]["children"], [])
+    
+    def test_restore_ghost_without_root_copy(self):
+        """Test that a ghost missing its root copy still restores its nodes"""
+        tree_data = load_tree_memory()
+        tree_data["nodes"]["node1"] = {"id": "node1", "user_input": "Edited", "children": []}
+        tree_data["ghost_branches"] = {"ghost_1": {
+            "id": "ghost_1", "original_node_id": "node1", "root_id": "node1",
+            "created_at": "2023-01-01", "reason": "test",
+            "nodes": {"node2": {"id": "node2", "parent_id": "node1", "children": []}}
+        }}
+        save_tree_memory(tree_data)
+        
+        response = app.test_client().post('/api/ghost-branches/ghost_1/restore')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("node2", load_tree_memory()["nodes"])
+        self.assertEqual(load_tree_memory()["nodes"]["node1"]["user_input"], "Edited")
+    
+    def test_create_ghost_branch_copies_deep_subtree(self):
+        """Test that ghosting copies arbitrarily deep subtrees independently"""
+        nodes = {}
+        parent_id = None
+        for i in range(3000):
+            node_id = f"node{i}"
+            nodes[node_id] = {"id": node_id, "user_input": f"Q{i}", "parent_id": parent_id,
+                              "children": [f"node{i + 1}"] if i < 2999 else []}
+            parent_id = node_id
+        tree_data = {"nodes": nodes, "root_id": "node0"}
+        
+        ghost_id = create_ghost_branch(tree_data, "node0")
+        ghost_nodes = tree_data["ghost_branches"][ghost_id]["nodes"]
+        
+        self.assertEqual(list(ghost_nodes), list(nodes))
+        nodes["node1"]["children"].append("extra")
+        self.assertEqual(ghost_nodes["node1"]["children"], ["node2"])
+    
+    @patch('app.query_ollama')
+    def test_edit_with_ghost_moves_children_into_ghost(self, mock_query):
+        """Test that a ghosting edit keeps the original branch and can restore it"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        first = json.loads(client.post('/api/chat', json={'message': 'First'}).data)
+        second = json.loads(client.post('/api/chat', json={
+            'message': 'Second', 'parent_id': first['node_id']}).data)
+        child = load_tree_memory()["nodes"][second['node_id']]
+        
+        data = json.loads(client.post(f"/api/node/{first['node_id']}/edit", json={
+            'user_input': 'Edited', 'create_ghost': True}).data)
+        
+        tree_data = load_tree_memory()
+        ghost = tree_data["ghost_branches"][data["ghost_branch_id"]]
+        self.assertNotIn(second['node_id'], tree_data["nodes"])
+        self.assertEqual(tree_data["nodes"][first['node_id']]["children"], [])
+        self.assertIs(ghost["nodes"][second['node_id']], child)
+        self.assertEqual(ghost["nodes"][first['node_id']]["user_input"], "First")
+        
+        client.post(f"/api/ghost-branches/{data['ghost_branch_id']}/restore")
+        restored = load_tree_memory()["nodes"]
+        self.assertEqual(restored[first['node_id']]["children"], [second['node_id']])
+        self.assertEqual(restored[first['node_id']]["user_input"], "Edited")
+        self.assertIn(second['node_id'], restored)
+    
+    def test_remove_subtree_handles_deep_and_cyclic_trees(self):
+        """Test that subtree removal works past the recursion limit and on cycles"""
+        nodes = {}
+        for i in range(3000):
+            nodes[f"node{i}"] = {"id": f"node{i}", "parent_id": f"node{i - 1}" if i else None,
+                                 "children": [f"node{i + 1}"] if i < 2999 else ["node1"]}
+        tree_data = {"nodes": nodes, "root_id": "node0"}
+        
+        remove_subtree(tree_data, "node0")
+        
+        self.assertEqual(list(tree_data["nodes"]), ["node0"])
+        self.assertEqual(tree_data["nodes"]["node0"]["children"], [])
+    
+    def test_record_edit_keeps_recent_history(self):
+        """Test that edit history is capped and older entries go to the edits log"""
+        node = {"id": "node1"}
+        
+        with patch('app.EDIT_HISTORY_MAX', 3):
+            for i in range(5):
+                record_edit("node1", node, {"timestamp": str(i)})
+        
+        self.assertEqual([e["timestamp"] for e in node["edit_history"]], ["2", "3", "4"])
+        with open(os.path.join(self.test_dir, 'test_tree_memory.edits.jsonl'), 'r') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records, [{"node_id": "node1", "entry": {"timestamp": "0"}},
+                                   {"node_id": "node1", "entry": {"timestamp": "1"}}])
+    
+    def test_evict_oldest_leaves(self):
+        """Test that eviction removes the oldest leaves and unlinks them"""
+        def node(node_id, parent_id, timestamp, children):
+            return {"id": node_id, "parent_id": parent_id, "timestamp": timestamp, "children": children}
+        tree_data = {
+            "nodes": {
+                "root": node("root", None, "2024-01-01T00:00:00", ["a", "b"]),
+                "a": node("a", "root", "2024-01-01T00:01:00", ["a1"]),
+                "a1": node("a1", "a", "2024-01-01T00:02:00", []),
+                "b": node("b", "root", "2024-01-01T00:03:00", []),
+            },
+            "root_id": "root"
+        }
+        
+        self.assertEqual(evict_oldest_leaves(tree_data, max_nodes=4), 0)
+        self.assertEqual(evict_oldest_leaves(tree_data, max_nodes=2), 2)
+        
+        self.assertEqual(set(tree_data["nodes"]), {"root", "b"})
+        self.assertEqual(tree_data["nodes"]["root"]["children"], ["b"])
+        self.assertEqual(tree_data["root_id"], "root")
+    
+    def test_evict_oldest_leaves_only_to_cap(self):
+        """Test that one node over the cap evicts one leaf unless a slack is set"""
+        def tree(count):
+            nodes = {"root": {"id": "root", "parent_id": None, "timestamp": "0", "children": []}}
+            for i in range(1, count):
+                nodes[f"n{i}"] = {"id": f"n{i}", "parent_id": "root", "timestamp": f"{i:04d}", "children": []}
+                nodes["root"]["children"].append(f"n{i}")
+            return {"nodes": nodes, "root_id": "root"}
+        
+        tree_data = tree(101)
+        self.assertEqual(evict_oldest_leaves(tree_data, max_nodes=100), 1)
+        self.assertEqual(len(tree_data["nodes"]), 100)
+        self.assertNotIn("n1", tree_data["nodes"])
+        
+        tree_data = tree(101)
+        self.assertEqual(evict_oldest_leaves(tree_data, max_nodes=100, slack=10), 11)
+        self.assertEqual(len(tree_data["nodes"]), 90)
+    
+    @patch('app.query_ollama')
+    @patch('app.TREE_MAX_NODES', 2)
+    def test_chat_over_cap_evicts_one_node(self, mock_query):
+        """Test that a chat turn one node past the cap evicts a single leaf"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        root_id = json.loads(client.post('/api/chat', json={'message': 'Root'}).data)['node_id']
+        for message in ('One', 'Two'):
+            client.post('/api/chat', json={'message': message, 'parent_id': root_id})
+        
+        nodes = load_tree_memory()["nodes"]
+        self.assertEqual(len(nodes), 2)
+        self.assertEqual(set(nodes), {root_id, *nodes[root_id]["children"]})
+    
+    @patch('app.query_ollama')
+    def test_get_node_served_from_memory(self, mock_query):
+        """Test that fetching a node never goes back to the tree file"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        node_id = json.loads(client.post('/api/chat', json={'message': 'Hello'}).data)['node_id']
+        
+        with patch('app._read_tree_file') as mock_read:
+            response = client.get(f'/api/node/{node_id}')
+        
+        mock_read.assert_not_called()
+        self.assertEqual(json.loads(response.data)['user_input'], 'Hello')
     
     def test_build_conversation_context_empty(self):
         """Test building context with empty tree"""
@@ -257,20 +826,216 @@ class TestTreeMemoryOperations(unittest.TestCase):
         self.assertIn("Human: How are you?", context)
         self.assertIn("Assistant: I'm doing well", context)
 
+    def test_build_conversation_context_deep_chain(self):
+        """Test that only the most recent exchanges of a deep chain are used"""
+        nodes = {}
+        parent_id = None
+        for i in range(50):
+            node_id = f"node{i}"
+            nodes[node_id] = {
+                "user_input": f"Question {i}",
+                "ai_response": f"Answer {i}",
+                "parent_id": parent_id
+            }
+            parent_id = node_id
+        tree_data = {"nodes": nodes, "root_id": "node0"}
 
-class TestUILayoutBehavior(unittest.TestCase):
-    """Test UI layout behavior and constraints"""
+        context = build_conversation_context(tree_data, "node49")
+        lines = context.split('\n')
+
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(lines[0], "Human: Question 45")
+        self.assertEqual(lines[-1], "Assistant: Answer 49")
+
+    def test_build_conversation_context_skips_empty_fields(self):
+        """Test that empty messages add no lines and ordering is preserved"""
+        nodes = {}
+        parent_id = None
+        for i in range(12):
+            node_id = f"node{i}"
+            nodes[node_id] = {
+                "user_input": f"Question {i}",
+                "ai_response": f"Answer {i}" if i % 2 else "",
+                "parent_id": parent_id
+            }
+            parent_id = node_id
+        tree_data = {"nodes": nodes, "root_id": "node0"}
+
+        context = build_conversation_context(tree_data, "node11")
+
+        self.assertEqual(context.split('\n'), [
+            "Assistant: Answer 5", "Human: Question 6",
+            "Human: Question 7", "Assistant: Answer 7", "Human: Question 8",
+            "Human: Question 9", "Assistant: Answer 9", "Human: Question 10",
+            "Human: Question 11", "Assistant: Answer 11"
+        ])
+
+    @patch('app.query_ollama')
+    def test_context_cache_is_bounded(self, mock_query):
+        """Test that cached contexts are capped and evicted ones are rebuilt"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+        
+        with patch('app.CONTEXT_CACHE_SIZE', 2):
+            ids = [json.loads(client.post('/api/chat', json={'message': f'Turn {i}'}).data)['node_id']
+                   for i in range(4)]
+            self.assertLessEqual(len(app_module._CONTEXT_CACHE), 2)
+            self.assertLessEqual(len(app_module._PATH_CACHE), 2)
+            
+            context = build_conversation_context(load_tree_memory(), ids[0])
+        self.assertEqual(context, "Human: Turn 0\nAssistant: Reply")
+
+    @patch('app.query_ollama')
+    def test_chat_turns_do_not_wait_on_each_other(self, mock_query):
+        """Test that a slow model call does not block chat turns on other branches"""
+        release = threading.Event()
+        
+        def query(prompt, model=None):
+            if "Slow" in prompt:
+                release.wait(5)
+            return "Reply"
+        
+        mock_query.side_effect = query
+        client = app.test_client()
+        slow = threading.Thread(target=lambda: app.test_client().post('/api/chat', json={'message': 'Slow'}))
+        slow.start()
+        try:
+            response = client.post('/api/chat', json={'message': 'Fast'})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(slow.is_alive())
+        finally:
+            release.set()
+            slow.join()
+        
+        messages = {node["user_input"] for node in load_tree_memory()["nodes"].values()}
+        self.assertEqual(messages, {"Slow", "Fast"})
+
+    @patch('app.query_ollama')
+    def test_chat_context_follows_branch(self, mock_query):
+        """Test that chat prompts include the conversation path of the parent"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+
+        first = json.loads(client.post('/api/chat', json={'message': 'First'}).data)
+        second = json.loads(client.post('/api/chat', json={
+            'message': 'Second', 'parent_id': first['node_id']}).data)
+        client.post('/api/chat', json={'message': 'Third', 'parent_id': second['node_id']})
+
+        prompt = mock_query.call_args[0][0]
+        self.assertEqual(prompt, "You are an autonomous language model. Here's our conversation so far:\n\n"
+                                 "Human: First\nAssistant: Reply\nHuman: Second\nAssistant: Reply\n\n"
+                                 "Now respond to: Third")
+        self.assertEqual(mock_query.call_args_list[0][0][0],
+                         "You are an autonomous language model. Respond to: First")
+
+    @patch('app.query_ollama')
+    def test_chat_context_reflects_edits(self, mock_query):
+        """Test that editing a node changes the context sent for its branches"""
+        mock_query.return_value = "Reply"
+        client = app.test_client()
+
+        first = json.loads(client.post('/api/chat', json={'message': 'Original'}).data)
+        client.post('/api/chat', json={'message': 'Follow up', 'parent_id': first['node_id']})
+        client.post(f"/api/node/{first['node_id']}/edit", json={'user_input': 'Edited'})
+        client.post('/api/chat', json={'message': 'Again', 'parent_id': first['node_id']})
+
+        prompt = mock_query.call_args[0][0]
+        self.assertIn("Human: Edited", prompt)
+        self.assertNotIn("Original", prompt)
+
+
+class TestOllamaHelpers(unittest.TestCase):
+    """Test helpers that talk to the Ollama server"""
     
     def setUp(self):
-        """Set up test environment"""
-        self.app = app
-        self.app.config['TESTING'] = True
-        self.client = self.app.test_client()
+        """Forget any cached connection status and models"""
+        self.status_patch = patch('app._ollama_status', (float('-inf'), False))
+        self.status_patch.start()
+        self.models_patch = patch('app._models_cache', (float('-inf'), [], frozenset()))
+        self.models_patch.start()
+    
+    def tearDown(self):
+        """Restore the connection status and model caches"""
+        self.models_patch.stop()
+        self.status_patch.stop()
+    
+    @patch('app.get_ollama_session')
+    def test_check_ollama_connection_reuses_recent_result(self, mock_session):
+        """Test that back-to-back status checks only hit Ollama once"""
+        mock_session.return_value.get.return_value = MagicMock(status_code=200)
+        
+        self.assertTrue(check_ollama_connection())
+        self.assertTrue(check_ollama_connection())
+        
+        mock_session.return_value.get.assert_called_once()
+    
+    @patch('app.get_ollama_session')
+    def test_check_ollama_connection_failure(self, mock_session):
+        """Test that connection errors report Ollama as unavailable"""
+        mock_session.return_value.get.side_effect = requests.ConnectionError("refused")
+        
+        self.assertFalse(check_ollama_connection())
+    
+    @patch('app.get_ollama_session')
+    def test_log_ollama_status_warns_when_unreachable(self, mock_session):
+        """Test that the startup check logs a warning when Ollama is down"""
+        mock_session.return_value.get.side_effect = requests.ConnectionError("refused")
+        
+        with self.assertLogs('app', level='WARNING') as logs:
+            app_module.log_ollama_status()
+        
+        self.assertIn("not responding", logs.output[0])
+    
+    @patch('app.get_ollama_session')
+    def test_get_available_models_uses_shared_session(self, mock_session):
+        """Test that model listing goes through the pooled Ollama session"""
+        mock_session.return_value.get.return_value.content = b'{"models": [{"name": "b"}, {"name": "a"}]}'
+        
+        models = get_available_models()
+        
+        self.assertEqual([m["name"] for m in models], ["a", "b"])
+        mock_session.return_value.get.assert_called_once()
+    
+    @patch('app.get_ollama_session')
+    def test_get_available_models_malformed_response(self, mock_session):
+        """Test that an unparseable model list is logged and treated as empty"""
+        mock_session.return_value.get.return_value.content = b'<html>not json</html>'
+        
+        with self.assertLogs('app', level='ERROR') as logs:
+            self.assertEqual(get_available_models(), [])
+        
+        self.assertIn("Error parsing models response", logs.output[0])
+    
+    @patch('app.get_ollama_session')
+    def test_get_available_models_reuses_recent_list(self, mock_session):
+        """Test that the model list is fetched once per TTL and failures are not cached"""
+        mock_session.return_value.get.side_effect = requests.ConnectionError("refused")
+        self.assertEqual(get_available_models(), [])
+        
+        mock_session.return_value.get.side_effect = None
+        mock_session.return_value.get.return_value.content = b'{"models": [{"name": "a"}]}'
+        self.assertEqual(len(get_available_models()), 1)
+        self.assertEqual(len(get_available_models()), 1)
+        
+        self.assertEqual(mock_session.return_value.get.call_count, 2)
+    
+    @patch('app.get_ollama_session')
+    def test_get_available_model_names(self, mock_session):
+        """Test that model names come back as a set built once per fetch"""
+        mock_session.return_value.get.return_value.content = b'{"models": [{"name": "b"}, {"name": "a"}]}'
+        
+        names = get_available_model_names()
+        
+        self.assertEqual(names, frozenset({"a", "b"}))
+        self.assertIs(get_available_model_names(), names)
+
+
+class TestUILayoutBehavior(unittest.TestCase):
+    """Test UI layout behavior and constraints"""
     
     def test_html_has_viewport_constraints(self):
         """Test that HTML has proper viewport constraints"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         # Critical layout constraints that prevent growing
         required_css = [
@@ -282,14 +1047,12 @@ class TestUILayoutBehavior(unittest.TestCase):
             'position: absolute',  # Footer positioning
         ]
         
-        for css_rule in required_css:
-            self.assertIn(css_rule, html_content, 
-                         f"Missing critical CSS rule: {css_rule}")
+        missing = missing_substrings(html_content, required_css)
+        self.assertEqual(missing, [], f"Missing critical CSS rules: {missing}")
     
     def test_html_has_proper_structure(self):
         """Test that HTML has proper structure to prevent layout growth"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         # Required structural elements
         required_elements = [
@@ -301,14 +1064,12 @@ class TestUILayoutBehavior(unittest.TestCase):
             'id="loading"'
         ]
         
-        for element in required_elements:
-            self.assertIn(element, html_content,
-                         f"Missing required element: {element}")
+        missing = missing_substrings(html_content, required_elements)
+        self.assertEqual(missing, [], f"Missing required elements: {missing}")
     
     def test_javascript_message_limiting(self):
         """Test that JavaScript includes message limiting logic"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         # Check for message limiting logic in JavaScript
         js_patterns = [
@@ -318,46 +1079,41 @@ class TestUILayoutBehavior(unittest.TestCase):
             'messagesDiv.scrollHeight'
         ]
         
-        for pattern in js_patterns:
-            self.assertIn(pattern, html_content,
-                         f"Missing JS pattern for message control: {pattern}")
+        missing = missing_substrings(html_content, js_patterns)
+        self.assertEqual(missing, [],
+                         f"Missing JS patterns for message control: {missing}")
+    
+    def test_missing_substrings_single_pass(self):
+        """Test the one-pass rule scan against overlapping and prefix rules"""
+        text = "margin-bottom: 0; height: 140px;"
+        
+        self.assertEqual(missing_substrings(text, ['height: 140px', 'height: 140']), [])
+        self.assertEqual(missing_substrings(text, ['bottom: 0', 'margin-bottom: 0']), [])
+        self.assertEqual(missing_substrings(text, ['height: 140px', 'height: 100vh']),
+                         ['height: 100vh'])
     
     def test_css_prevents_flex_growth(self):
         """Test that CSS prevents problematic flex growth"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         # Should NOT contain problematic flex rules on messages
-        problematic_patterns = [
-            '#messages {\n            flex: 1',
-            'flex-grow: 1'
-        ]
-        
-        for pattern in problematic_patterns:
-            self.assertNotIn(pattern, html_content,
-                           f"Found problematic CSS that could cause growth: {pattern}")
+        match = PROBLEMATIC_FLEX_RE.search(html_content)
+        self.assertIsNone(match, "Found problematic CSS that could cause growth: "
+                          f"{match and match.group(0)}")
 
 
 class TestMessageHandling(unittest.TestCase):
     """Test message handling and UI feedback"""
     
-    def setUp(self):
-        """Set up test environment"""
-        self.app = app
-        self.app.config['TESTING'] = True
-        self.client = self.app.test_client()
-    
     def test_showMessage_function_exists(self):
         """Test that showMessage function exists in JavaScript"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         self.assertIn('function showMessage(message, type)', html_content)
     
     def test_message_cleanup_logic(self):
         """Test that message cleanup logic is present"""
-        response = self.client.get('/')
-        html_content = response.data.decode('utf-8')
+        html_content = index_html()
         
         # Check for auto-removal logic
         self.assertIn('setTimeout', html_content)
@@ -0,0 +1,28 @@
+"""Helpers shared by the test modules"""
+import functools
+import re
+
+from app import app
+
+
+@functools.lru_cache(maxsize=None)
+def index_html():
+    """Return the decoded index page, rendered on first use and then shared.
+    
+    The page is static, so every HTML check runs against a single render.
+    """
+    with app.test_client() as client:
+        return client.get('/').data.decode('utf-8')
+
+
+def missing_substrings(text, needles):
+    """Return the needles that do not occur in text, scanning it once.
+    
+    The alternation is tried longest first inside a lookahead, so at every
+    position it records the longest needle starting there. A needle that only
+    occurs as a prefix of a longer one is therefore seen through that match.
+    """
+    pattern = re.compile('(?=(%s))' % '|'.join(
+        re.escape(n) for n in sorted(set(needles), key=len, reverse=True)))
+    found = set(pattern.findall(text))
+    return [n for n in needles if not any(match.startswith(n) for match in found)]